@@ -0,0 +1,55 @@
+"""Benchmark: DictWriter riga per riga vs frammenti precalcolati scritti a blocchi.
+
+Il backend NumPy, se installato, è misurato a parte.
+
+Uso:
+    python benchmarks/bench_csv_writer.py [numero_corsi]
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_sort_key import make_events
+from calendar_engine import CSV_HEADERS, iter_csv_rows, numpy_available, write_csv
+
+def write_dict_rows(events, filename: str) -> int:
+    # The writer used before the fragment path: one 9-key dict per occurrence
+    count = 0
+    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=CSV_HEADERS)
+        writer.writeheader()
+        for row in iter_csv_rows(events):
+            writer.writerow(row)
+            count += 1
+    return count
+
+def measure(label: str, func, events, filename: str, baseline: float = 0.0) -> float:
+    start = time.perf_counter()
+    rows = func(events, filename)
+    elapsed = time.perf_counter() - start
+    speedup = f"  ({baseline / elapsed:.1f}x)" if baseline else ""
+    print(f"{label:<28} {elapsed:6.3f}s  {rows / elapsed:>10,.0f} righe/s  "
+          f"{os.path.getsize(filename) / 1e6:6.1f} MB{speedup}")
+    return elapsed
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2800
+    events = make_events(n)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = os.path.join(tmp, 'calendar.csv')
+        dict_time = measure("DictWriter (vecchio)", write_dict_rows, events, plain)
+        # Pinned to the Python writer: 'auto' switches to NumPy on large inputs
+        write_python = partial(write_csv, backend='python')
+        measure("frammenti a blocchi", write_python, events, plain, dict_time)
+        measure("frammenti a blocchi + gzip", write_python, events, plain + '.gz', dict_time)
+        if numpy_available():
+            measure("NumPy", partial(write_csv, backend='numpy'), events, plain, dict_time)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Benchmark: ordinamento su stringhe vs chiave intera (ordinale, minuti).
+
+Uso:
+    python benchmarks/bench_sort_key.py [numero_corsi]
+"""
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calendar_engine import (
+    CourseEvent, Session, build_occurrence_streams, decode_occurrence_key, format_csv_row,
+)
+
+def make_events(n: int):
+    random.seed(42)
+    events = []
+    for i in range(n):
+        sessions = []
+        for _ in range(4):
+            hour = random.randint(7, 18)
+            sessions.append(Session(random.randint(0, 4), f"{hour:02d}:15",
+                                    f"{hour + 2:02d}:15", f"Aula {random.randint(1, 40)}"))
+        events.append(CourseEvent(f"Corso {i}", f"Docente {i}", "15/09/2024",
+                                  "22/06/2026", sessions))
+    return events
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2800
+    events = make_events(n)
+    
+    sources, streams = build_occurrence_streams(events)
+    n = len(sources)
+    keys = [key for stream in streams for key in stream]
+    rows = []
+    for key in keys:
+        ordinal, _, idx = decode_occurrence_key(key, n)
+        rows.append(format_csv_row(*sources[idx], ordinal))
+    print(f"{len(rows)} righe, {n} sessioni")
+    
+    random.shuffle(rows)
+    start = time.perf_counter()
+    rows.sort(key=lambda r: (r['Start Date'], r['Start Time'] or '00:00'))
+    string_sort = time.perf_counter() - start
+    print(f"sort su stringhe (vecchio):     {string_sort:.3f}s")
+    
+    random.shuffle(keys)
+    start = time.perf_counter()
+    keys.sort()
+    int_sort = time.perf_counter() - start
+    print(f"sort su chiave intera:          {int_sort:.3f}s  ({string_sort / int_sort:.1f}x)")
+    
+    start = time.perf_counter()
+    for key in heapq.merge(*streams):
+        decode_occurrence_key(key, n)
+    int_merge = time.perf_counter() - start
+    print(f"merge a k vie su chiave intera: {int_merge:.3f}s  ({string_sort / int_merge:.1f}x)")
+
+if __name__ == '__main__':
+    main()
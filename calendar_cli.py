@@ -0,0 +1,141 @@
+"""Interfaccia a riga di comando: genera il CSV senza caricare tkinter.
+
+Uso:
+    python -m calendar_cli generate config.json -o calendar.csv
+    python -m calendar_cli generate config.json -o calendar.ics
+    python -m calendar_cli import dip1.csv dip2.csv -o config.json
+    python -m calendar_cli import dip1.csv -o catalogo.db
+    python -m calendar_cli generate catalogo.db --from 15/09/2025 --to 22/12/2025 -o calendar.csv
+    python -m calendar_cli generate config.json --from 01/11/2025 --to 30/11/2025 -o novembre.csv
+    python -m calendar_cli generate config.json --exclude "24/12/2025-06/01/2026, 08/12/2025" -o calendar.csv
+    python -m calendar_cli conflicts config.json --rooms
+"""
+import argparse
+import sys
+from datetime import date
+from typing import List, Optional
+
+from calendar_engine import (
+    apply_exclusions, find_conflicts, format_conflict, load_config_file, load_csv_files,
+    normalize_exclusions, parse_date_flexible, parse_exclusions, save_config_file, write_csv, write_ics,
+)
+from calendar_store import EventStore, is_store_file
+
+def parse_term_date(value: Optional[str]) -> Optional[int]:
+    if value is None:
+        return None
+    date_obj = parse_date_flexible(value)
+    if date_obj is None:
+        raise ValueError(f"Formato data non valido: {value}")
+    return date_obj.toordinal()
+
+def load_events(args, extra_exclusions=()):
+    """Eventi della configurazione o dell'archivio, con le chiusure globali già applicate"""
+    if not is_store_file(args.config):
+        events, exclusions = load_config_file(args.config)
+    else:
+        # Only the requested term is read from the catalog
+        with EventStore(args.config) as store:
+            events = store.query(parse_term_date(args.date_from), parse_term_date(args.date_to))
+            exclusions = store.exclusions()
+    return apply_exclusions(events, normalize_exclusions(exclusions + extra_exclusions))
+
+def export_window(args):
+    if args.date_from is None and args.date_to is None:
+        return None
+    start = parse_term_date(args.date_from)
+    end = parse_term_date(args.date_to)
+    return (date.min.toordinal() if start is None else start,
+            date.max.toordinal() if end is None else end)
+
+def cmd_generate(args) -> int:
+    events = load_events(args, parse_exclusions(args.exclude) if args.exclude else ())
+    if not events:
+        print("Nessun evento nella configurazione", file=sys.stderr)
+        return 1
+
+    if args.output.lower().endswith('.ics'):
+        count = write_ics(events, args.output)
+        print(f"ICS salvato: {args.output} ({count} eventi ricorrenti)", file=sys.stderr)
+        return 0
+
+    count = write_csv(events, args.output, backend=args.backend, window=export_window(args))
+    print(f"CSV salvato: {args.output} ({count} eventi)", file=sys.stderr)
+    return 0
+
+def cmd_conflicts(args) -> int:
+    events = load_events(args)
+    conflicts = find_conflicts(events, same_location=args.rooms)
+    for conflict in conflicts:
+        print(format_conflict(conflict))
+
+    kind = "di aula" if args.rooms else "di orario"
+    print(f"{len(conflicts)} conflitti {kind}", file=sys.stderr)
+    return 1 if conflicts else 0
+
+def cmd_import(args) -> int:
+    events, timings = load_csv_files(args.csv_files, workers=args.jobs)
+    for filename, count, seconds in timings:
+        print(f"{filename}: {count} eventi in {seconds:.2f}s", file=sys.stderr)
+
+    if not events:
+        print("Nessun evento nei CSV", file=sys.stderr)
+        return 1
+
+    if is_store_file(args.output):
+        with EventStore(args.output) as store:
+            counts = store.add_events(events)
+            total = store.count()
+        print(f"Archivio aggiornato: {args.output} ({counts['added']} nuovi, {counts['merged']} uniti, "
+              f"{counts['duplicate']} già presenti; {total} in totale)", file=sys.stderr)
+        return 0
+
+    save_config_file(events, args.output)
+    print(f"Configurazione salvata: {args.output} ({len(events)} eventi)", file=sys.stderr)
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="calendar_cli",
+        description="Google Calendar CSV Generator (headless)"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate", help="Genera il CSV o l'ICS da una configurazione JSON")
+    generate.add_argument("config", help="File di configurazione JSON o archivio SQLite (.db)")
+    generate.add_argument("--from", dest="date_from", help="Esporta solo le occorrenze da questa data")
+    generate.add_argument("--to", dest="date_to", help="Esporta solo le occorrenze fino a questa data")
+    generate.add_argument("-o", "--output", required=True,
+                          help="File di destinazione: CSV (gzip se termina in .gz) o iCalendar se termina in .ics")
+    generate.add_argument("--exclude", help="Chiusure per tutti i corsi, es. \"24/12/2025-06/01/2026, 08/12/2025\"")
+    generate.add_argument("--backend", choices=("auto", "python", "numpy"), default="auto",
+                          help="Espansione delle occorrenze (numpy se installato; default: auto)")
+    generate.set_defaults(func=cmd_generate)
+
+    conflicts = subparsers.add_parser("conflicts", help="Elenca le sessioni sovrapposte (codice 1 se ce ne sono)")
+    conflicts.add_argument("config", help="File di configurazione JSON o archivio SQLite (.db)")
+    conflicts.add_argument("--from", dest="date_from", help="Con un archivio: inizio del periodo")
+    conflicts.add_argument("--to", dest="date_to", help="Con un archivio: fine del periodo")
+    conflicts.add_argument("--rooms", action="store_true",
+                           help="Solo sovrapposizioni nella stessa aula")
+    conflicts.set_defaults(func=cmd_conflicts)
+
+    import_ = subparsers.add_parser("import", help="Unisce uno o più CSV in una configurazione JSON")
+    import_.add_argument("csv_files", nargs="+", help="File CSV Google Calendar")
+    import_.add_argument("-o", "--output", required=True, help="Configurazione JSON di destinazione, o archivio SQLite (.db) a cui aggiungere")
+    import_.add_argument("-j", "--jobs", type=int, default=None,
+                         help="Processi paralleli (default: numero di CPU)")
+    import_.set_defaults(func=cmd_import)
+
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except Exception as e:
+        print(f"Errore: {str(e)}", file=sys.stderr)
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
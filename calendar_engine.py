@@ -0,0 +1,2202 @@
+"""Motore di generazione headless: modello, parsing e scrittura CSV senza tkinter."""
+import codecs
+import csv
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import mmap
+import os
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, List, Dict, Optional, Iterable, Iterator, Tuple
+from functools import lru_cache, partial
+from itertools import chain, islice
+from enum import Enum
+from collections.abc import MutableSequence
+
+CSV_HEADERS = ['Subject', 'Start Date', 'Start Time', 'End Date', 'End Time',
+               'All Day Event', 'Description', 'Location', 'Private']
+
+class DateFormat(Enum):
+    ITALIAN = "DD/MM/YYYY"
+    ISO = "YYYY-MM-DD"
+
+MINUTES_PER_DAY = 24 * 60
+ENCODING_SNIFF_BYTES = 64 * 1024
+DATE_SNIFF_ROWS = 256
+DEFAULT_TIME_MINUTES = 9 * 60
+PROGRESS_EVERY_ROWS = 5000
+PROGRESS_EVERY_EVENTS = 100
+CSV_WRITE_BATCH_ROWS = PROGRESS_EVERY_ROWS
+# zlib level 6: close to the size of 9 at a fraction of the time
+GZIP_LEVEL = 6
+# Below this many rows importing NumPy costs more than it saves
+NUMPY_MIN_ROWS = 50_000
+PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+CHUNKS_PER_WORKER = 4
+SCAN_WINDOW_BYTES = 4 * 1024 * 1024
+
+# progress(done, total): called periodically by long operations; raising
+# OperationCancelled from it aborts the operation
+ProgressCallback = Callable[[int, int], None]
+
+class OperationCancelled(Exception):
+    """Operazione interrotta dall'utente tramite il callback di avanzamento"""
+
+WEEKDAYS_IT = ["Lunedì", "Martedì", "Mercoledì", "Giovedì", "Venerdì", "Sabato", "Domenica"]
+
+class Session:
+    """Sessione settimanale compatta.
+    
+    Gli orari sono memorizzati come minuti dalla mezzanotte; start_time/end_time
+    ("HH:MM") sono viste usate solo per la visualizzazione e il JSON.
+    """
+    __slots__ = ('weekday', 'start_minutes', 'end_minutes', 'location')
+    
+    def __init__(self, weekday: int, start_time: str, end_time: str, location: str):
+        self.weekday = weekday  # 0=Lunedì, 6=Domenica
+        self.start_minutes = _session_minutes(start_time)
+        self.end_minutes = _session_minutes(end_time)
+        self.location = sys.intern(location)
+    
+    @classmethod
+    def from_minutes(cls, weekday: int, start_minutes: int, end_minutes: int, location: str) -> 'Session':
+        session = cls.__new__(cls)
+        session.weekday = weekday
+        session.start_minutes = start_minutes
+        session.end_minutes = end_minutes
+        session.location = sys.intern(location)
+        return session
+    
+    @property
+    def start_time(self) -> str:
+        return HHMM_BY_MINUTES[self.start_minutes]
+    
+    @start_time.setter
+    def start_time(self, value: str):
+        self.start_minutes = _session_minutes(value)
+    
+    @property
+    def end_time(self) -> str:
+        return HHMM_BY_MINUTES[self.end_minutes]
+    
+    @end_time.setter
+    def end_time(self, value: str):
+        self.end_minutes = _session_minutes(value)
+    
+    def key(self) -> Tuple[int, int, int, str]:
+        return (self.weekday, self.start_minutes, self.end_minutes, self.location)
+    
+    def __eq__(self, other):
+        if not isinstance(other, Session):
+            return NotImplemented
+        return self.key() == other.key()
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return (f"Session(weekday={self.weekday!r}, start_time={self.start_time!r}, "
+                f"end_time={self.end_time!r}, location={self.location!r})")
+    
+    def __str__(self):
+        return f"{WEEKDAYS_IT[self.weekday]} {self.start_time}-{self.end_time} @ {self.location}"
+
+class CourseEvent:
+    """Corso con date memorizzate come ordinali.
+    
+    start_date/end_date ("DD/MM/YYYY") sono viste per la visualizzazione e il
+    JSON; in assegnazione accettano tutti i formati di parse_date_flexible.
+    exclusions sono gli intervalli di date (ordinali inclusi) senza lezioni,
+    ordinati e uniti da normalize_exclusions.
+    """
+    __slots__ = ('subject', 'description', 'start_ordinal', 'end_ordinal',
+                 'sessions', 'is_private', 'all_day', 'exclusions')
+    
+    def __init__(self, subject: str, description: str, start_date: str, end_date: str,
+                 sessions: List[Session], is_private: bool = True, all_day: bool = False,
+                 exclusions: Iterable[Tuple[int, int]] = ()):
+        self.subject = subject
+        self.description = sys.intern(description)
+        self.start_ordinal = _event_ordinal(start_date)
+        self.end_ordinal = _event_ordinal(end_date)
+        self.sessions = sessions
+        self.is_private = is_private
+        self.all_day = all_day
+        self.exclusions = normalize_exclusions(exclusions)
+    
+    @classmethod
+    def from_ordinals(cls, subject: str, description: str, start_ordinal: int, end_ordinal: int,
+                      sessions: List[Session], is_private: bool = True,
+                      all_day: bool = False, exclusions: Iterable[Tuple[int, int]] = ()) -> 'CourseEvent':
+        event = cls.__new__(cls)
+        event.subject = subject
+        event.description = sys.intern(description)
+        event.start_ordinal = start_ordinal
+        event.end_ordinal = end_ordinal
+        event.sessions = sessions
+        event.is_private = is_private
+        event.all_day = all_day
+        event.exclusions = normalize_exclusions(exclusions)
+        return event
+    
+    @property
+    def start_date(self) -> str:
+        return format_italian_date(self.start_ordinal)
+    
+    @start_date.setter
+    def start_date(self, value: str):
+        self.start_ordinal = _event_ordinal(value)
+    
+    @property
+    def end_date(self) -> str:
+        return format_italian_date(self.end_ordinal)
+    
+    @end_date.setter
+    def end_date(self, value: str):
+        self.end_ordinal = _event_ordinal(value)
+    
+    def get_total_occurrences(self) -> int:
+        """Numero esatto di righe CSV generate, in O(1) per sessione e intervallo escluso"""
+        if len({session.key() for session in self.sessions}) < len(self.sessions):
+            # Repeated sessions write their rows once
+            return count_total_occurrences([self])
+        if self.all_day:
+            return count_occurrences(self.start_ordinal, self.end_ordinal, 1, self.exclusions)
+        return sum(count_occurrences(first_weekday_ordinal(self.start_ordinal, session.weekday),
+                                     self.end_ordinal, 7, self.exclusions)
+                   for session in self.sessions)
+    
+    @staticmethod
+    def parse_date(date_str: str) -> datetime:
+        date_obj = _parse_date_formats(date_str, ["%d/%m/%Y", "%Y-%m-%d"])
+        if date_obj is None:
+            raise ValueError(f"Formato data non valido: {date_str}")
+        return date_obj
+    
+    def content_key(self) -> tuple:
+        """Chiave hashable sul contenuto (archivio SQLite, UID iCalendar)"""
+        return (self.subject, self.description, self.start_ordinal, self.end_ordinal,
+                tuple(session.key() for session in self.sessions), self.is_private, self.all_day,
+                self.exclusions)
+    
+    def __eq__(self, other):
+        if not isinstance(other, CourseEvent):
+            return NotImplemented
+        return self.content_key() == other.content_key()
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return (f"CourseEvent(subject={self.subject!r}, description={self.description!r}, "
+                f"start_date={self.start_date!r}, end_date={self.end_date!r}, "
+                f"sessions={self.sessions!r}, is_private={self.is_private!r}, "
+                f"all_day={self.all_day!r}, exclusions={self.exclusions!r})")
+
+def first_weekday_ordinal(start_ordinal: int, weekday: int) -> int:
+    """Primo giorno >= start_ordinal che cade nel giorno della settimana indicato"""
+    # date.fromordinal(1) is a Monday, so weekday == (ordinal - 1) % 7
+    return start_ordinal + (weekday - (start_ordinal - 1)) % 7
+
+def count_weekday_occurrences(start_ordinal: int, end_ordinal: int, weekday: int) -> int:
+    first = first_weekday_ordinal(start_ordinal, weekday)
+    if first > end_ordinal:
+        return 0
+    return (end_ordinal - first) // 7 + 1
+
+def normalize_exclusions(ranges: Iterable[Tuple[int, int]]) -> Tuple[Tuple[int, int], ...]:
+    """Intervalli di date escluse (ordinali inclusi) ordinati, con quelli contigui uniti"""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if end < start:
+            continue
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return tuple(merged)
+
+def exclusion_gaps(first: int, last: int, step: int,
+                   exclusions: Tuple[Tuple[int, int], ...]) -> List[Tuple[int, int]]:
+    """Tratti [inizio, fine] della progressione first, first + step, ... <= last fuori dalle esclusioni.
+    
+    Le esclusioni sono ordinate, quindi un periodo di chiusura costa un salto
+    nella progressione, indipendentemente da quante date contiene.
+    """
+    gaps = []
+    for start, end in exclusions:
+        if first > last or start > last:
+            break
+        if end < first:
+            continue
+        if start > first:
+            gaps.append((first, start - 1))
+        # First date of the progression after the closed period
+        first += -(-(end + 1 - first) // step) * step
+    if first <= last:
+        gaps.append((first, last))
+    return gaps
+
+def intersect_exclusions(first: Tuple[Tuple[int, int], ...],
+                         second: Tuple[Tuple[int, int], ...]) -> Tuple[Tuple[int, int], ...]:
+    """Date escluse in entrambi gli elenchi ordinati, in un solo passaggio"""
+    result = []
+    i = j = 0
+    while i < len(first) and j < len(second):
+        start = max(first[i][0], second[j][0])
+        end = min(first[i][1], second[j][1])
+        if start <= end:
+            result.append((start, end))
+        if first[i][1] < second[j][1]:
+            i += 1
+        else:
+            j += 1
+    return normalize_exclusions(result)
+
+def _exclusions_within(event: 'CourseEvent', start: int, end: int) -> Tuple[Tuple[int, int], ...]:
+    # The event's exclusions plus the part of [start, end] outside its own range
+    return normalize_exclusions(event.exclusions + ((start, event.start_ordinal - 1),
+                                                    (event.end_ordinal + 1, end)))
+
+def count_occurrences(first: int, last: int, step: int,
+                      exclusions: Tuple[Tuple[int, int], ...] = ()) -> int:
+    return sum((end - start) // step + 1 for start, end in exclusion_gaps(first, last, step, exclusions))
+
+def count_total_occurrences(events: List['CourseEvent'], window: Optional[Tuple[int, int]] = None) -> int:
+    """Righe CSV scritte da write_csv (nella finestra, se data), senza le occorrenze identiche deduplicate"""
+    sources, streams = build_occurrence_streams(events, window)
+    return count_unique_occurrences(sources, streams)
+
+def _session_minutes(time_str: str) -> int:
+    minutes = time_to_minutes(time_str)
+    # Same fallback as format_time_12h for invalid times
+    return DEFAULT_TIME_MINUTES if minutes is None else minutes
+
+def _event_ordinal(date_str: str) -> int:
+    date_obj = parse_date_flexible(date_str)
+    if date_obj is None:
+        raise ValueError(f"Formato data non valido: {date_str}")
+    return date_obj.toordinal()
+
+@lru_cache(maxsize=8192)
+def format_italian_date(ordinal: int) -> str:
+    """Ordinale data -> "DD/MM/YYYY" per la visualizzazione"""
+    return datetime.fromordinal(ordinal).strftime("%d/%m/%Y")
+
+# Formats accepted in the GUI/config (day first) and in Google CSVs (month first)
+DATE_FORMATS = ["%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%Y/%m/%d", "%m/%d/%Y"]
+GOOGLE_DATE_FORMATS = ["%m/%d/%Y", "%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%Y/%m/%d"]
+
+# fmt -> (separator, separator positions, year slice, month slice, day slice)
+_FIXED_WIDTH_DATES = {
+    "%d/%m/%Y": ('/', (2, 5), (6, 10), (3, 5), (0, 2)),
+    "%m/%d/%Y": ('/', (2, 5), (6, 10), (0, 2), (3, 5)),
+    "%d-%m-%Y": ('-', (2, 5), (6, 10), (3, 5), (0, 2)),
+    "%Y-%m-%d": ('-', (4, 7), (0, 4), (5, 7), (8, 10)),
+    "%Y/%m/%d": ('/', (4, 7), (0, 4), (5, 7), (8, 10)),
+}
+
+def parse_fixed_width_date(date_str: str, fmt: str) -> Optional[datetime]:
+    """Parsing per slicing di una data a 10 caratteri; None se non combacia, senza eccezioni"""
+    sep, (first_sep, second_sep), year, month, day = _FIXED_WIDTH_DATES[fmt]
+    if len(date_str) != 10 or date_str[first_sep] != sep or date_str[second_sep] != sep:
+        return None
+    
+    year_str = date_str[year[0]:year[1]]
+    month_str = date_str[month[0]:month[1]]
+    day_str = date_str[day[0]:day[1]]
+    if not (year_str + month_str + day_str).isdigit():
+        return None
+    
+    try:
+        return datetime(int(year_str), int(month_str), int(day_str))
+    except ValueError:
+        return None
+
+def _parse_date_formats(date_str: str, formats: List[str]) -> Optional[datetime]:
+    # Fast path for zero-padded dates, strptime only for the rest (e.g. "1/9/2025")
+    for fmt in formats:
+        date_obj = parse_fixed_width_date(date_str, fmt)
+        if date_obj is not None:
+            return date_obj
+    
+    for fmt in formats:
+        try:
+            return datetime.strptime(date_str, fmt)
+        except:
+            continue
+    return None
+
+def parse_date_flexible(date_str: str) -> Optional[datetime]:
+    return _parse_date_formats(date_str.strip(), DATE_FORMATS)
+
+def sniff_date_format(samples: Iterable[str], formats: List[str] = GOOGLE_DATE_FORMATS) -> Optional[str]:
+    """Sceglie il formato che interpreta più campioni (a parità vale l'ordine di formats)"""
+    counts = [0] * len(formats)
+    
+    for sample in samples:
+        sample = sample.strip()
+        if not sample:
+            continue
+        for i, fmt in enumerate(formats):
+            if parse_fixed_width_date(sample, fmt) is not None:
+                counts[i] += 1
+    
+    best = max(range(len(formats)), key=lambda i: (counts[i], -i))
+    return formats[best] if counts[best] else None
+
+class DateParser:
+    """Parser con formato deciso una volta per file/colonna.
+    
+    Le date nel formato rilevato passano da un parsing per slicing; solo gli
+    outlier usano strptime e poi il parser di fallback.
+    """
+    def __init__(self, fmt: Optional[str], fallback: Callable[[str], Optional[datetime]]):
+        self.fmt = fmt
+        self.fallback = fallback
+        self._cache: Dict[str, Optional[datetime]] = {}
+    
+    @classmethod
+    def sniff(cls, samples: Iterable[str], formats: List[str] = GOOGLE_DATE_FORMATS,
+              fallback: Optional[Callable[[str], Optional[datetime]]] = None) -> 'DateParser':
+        return cls(sniff_date_format(samples, formats), fallback or parse_google_date)
+    
+    def __call__(self, date_str: str) -> Optional[datetime]:
+        try:
+            return self._cache[date_str]
+        except KeyError:
+            pass
+        
+        date_obj = None
+        if self.fmt is not None:
+            date_obj = parse_fixed_width_date(date_str, self.fmt)
+            if date_obj is None:
+                try:
+                    date_obj = datetime.strptime(date_str, self.fmt)
+                except ValueError:
+                    pass
+        if date_obj is None:
+            date_obj = self.fallback(date_str)
+        
+        self._cache[date_str] = date_obj
+        return date_obj
+
+def parse_time(time_str: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(time_str.strip(), "%H:%M")
+    except:
+        return None
+
+def _build_time_tables() -> Tuple[List[str], List[str], Dict[str, int], Dict[str, str], Dict[str, str]]:
+    """Tabelle precalcolate per i 1440 minuti del giorno"""
+    hhmm_by_minutes = []
+    by_minutes = []
+    minutes_by_hhmm = {}
+    hhmm_to_12h = {}
+    from_12h = {}
+    
+    for minutes in range(MINUTES_PER_DAY):
+        hour, minute = divmod(minutes, 60)
+        hhmm = f"{hour:02d}:{minute:02d}"
+        hour_12 = hour % 12 or 12
+        suffix = 'AM' if hour < 12 else 'PM'
+        label = f"{hour_12}:{minute:02d} {suffix}"
+        
+        hhmm_by_minutes.append(hhmm)
+        by_minutes.append(label)
+        minutes_by_hhmm[hhmm] = minutes
+        hhmm_to_12h[hhmm] = label
+        from_12h[label] = hhmm
+        from_12h[f"{hour_12:02d}:{minute:02d} {suffix}"] = hhmm
+    
+    return hhmm_by_minutes, by_minutes, minutes_by_hhmm, hhmm_to_12h, from_12h
+
+(HHMM_BY_MINUTES, TIME_12H_BY_MINUTES, _MINUTES_BY_HHMM,
+ _TIME_12H_BY_HHMM, _HHMM_BY_TIME_12H) = _build_time_tables()
+
+@lru_cache(maxsize=4096)
+def _parse_time_12h_slow(time_str: str) -> str:
+    try:
+        time_obj = datetime.strptime(time_str, "%I:%M %p")
+        return time_obj.strftime("%H:%M")
+    except:
+        try:
+            if time_str.startswith("0"):
+                time_str = time_str[1:]
+            time_obj = datetime.strptime(time_str, "%I:%M %p")
+            return time_obj.strftime("%H:%M")
+        except:
+            return "09:00"
+
+def parse_time_12h(time_str: str) -> str:
+    if not time_str:
+        return "09:00"
+    time_str = time_str.strip()
+    if not time_str:
+        return "09:00"
+    hhmm = _HHMM_BY_TIME_12H.get(time_str)
+    if hhmm is not None:
+        return hhmm
+    return _parse_time_12h_slow(time_str)
+
+def format_date_for_google(date: datetime) -> str:
+    return format_google_date(date.toordinal())
+
+@lru_cache(maxsize=8192)
+def format_google_date(ordinal: int) -> str:
+    """Ordinale data -> "MM/DD/YYYY", memoizzato (poche centinaia di date per semestre)"""
+    return datetime.fromordinal(ordinal).strftime("%m/%d/%Y")
+
+@lru_cache(maxsize=8192)
+def parse_google_date(date_str: str) -> Optional[datetime]:
+    """Data CSV Google (MM/DD/YYYY) -> datetime, con fallback flessibile e memoizzazione"""
+    try:
+        return datetime.strptime(date_str, "%m/%d/%Y")
+    except:
+        return parse_date_flexible(date_str)
+
+@lru_cache(maxsize=4096)
+def _format_time_12h_slow(time_str: str) -> str:
+    try:
+        time_obj = datetime.strptime(time_str, "%H:%M")
+        return time_obj.strftime("%I:%M %p").lstrip("0")
+    except:
+        return "09:00 AM"
+
+def format_time_12h(time_str: str) -> str:
+    label = _TIME_12H_BY_HHMM.get(time_str)
+    if label is not None:
+        return label
+    return _format_time_12h_slow(time_str)
+
+def time_to_minutes(time_str: str) -> Optional[int]:
+    """HH:MM -> minuti dalla mezzanotte (None se non valido)"""
+    minutes = _MINUTES_BY_HHMM.get(time_str)
+    if minutes is not None:
+        return minutes
+    time_obj = parse_time(time_str)
+    if not time_obj:
+        return None
+    return time_obj.hour * 60 + time_obj.minute
+
+def sniff_encoding(block: bytes, final: bool = False) -> str:
+    """Sceglie la codifica del CSV guardando solo il primo blocco del file"""
+    if block.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # Incremental decoder: a multibyte char cut at the block end is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(block, final=final)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin1'
+
+def iter_csv_file_rows(filename: str, encoding: Optional[str] = None,
+                       progress: Optional[ProgressCallback] = None) -> Iterator[Dict]:
+    """Legge il CSV riga per riga, senza caricarlo in memoria"""
+    with open(filename, 'rb') as raw:
+        if encoding is None:
+            block = raw.read(ENCODING_SNIFF_BYTES)
+            encoding = sniff_encoding(block, final=len(block) < ENCODING_SNIFF_BYTES)
+            raw.seek(0)
+        
+        with io.TextIOWrapper(raw, encoding=encoding, newline='') as csvfile:
+            if progress is None:
+                yield from csv.DictReader(csvfile)
+                return
+            
+            # Progress in bytes consumed from the file
+            size = os.fstat(raw.fileno()).st_size
+            for count, row in enumerate(csv.DictReader(csvfile), 1):
+                if count % PROGRESS_EVERY_ROWS == 0:
+                    progress(raw.tell(), size)
+                yield row
+            progress(size, size)
+
+def group_csv_rows(rows: Iterable[Dict]) -> List[CourseEvent]:
+    """Raggruppa le righe per (Subject, Description) man mano che arrivano"""
+    # Detect the Start Date format once from the first rows of the file
+    rows = iter(rows)
+    head = list(islice(rows, DATE_SNIFF_ROWS))
+    parse_date = DateParser.sniff(row.get('Start Date') or '' for row in head)
+    
+    event_groups = accumulate_csv_rows(chain(head, rows), parse_date)
+    
+    # Convert groups back to CourseEvent objects
+    return [accumulator.to_course_event() for accumulator in event_groups.values()]
+
+def accumulate_csv_rows(rows: Iterable[Dict], parse_date: Callable[[str], Optional[datetime]]
+                        ) -> Dict[Tuple[str, str], 'CourseAccumulator']:
+    # Group events by subject and description
+    event_groups: Dict[Tuple[str, str], CourseAccumulator] = {}
+    
+    for row in rows:
+        subject = (row.get('Subject') or '').strip()
+        description = (row.get('Description') or '').strip()
+        
+        if not subject:
+            continue
+        
+        key = (subject, description)
+        accumulator = event_groups.get(key)
+        if accumulator is None:
+            accumulator = event_groups[key] = CourseAccumulator(subject, description)
+        accumulator.add(row, parse_date)
+    
+    return event_groups
+
+def load_csv_events(filename: str, progress: Optional[ProgressCallback] = None) -> List[CourseEvent]:
+    """Carica eventi da un file CSV e li converte in CourseEvent"""
+    try:
+        try:
+            return group_csv_rows(iter_csv_file_rows(filename, progress=progress))
+        except UnicodeDecodeError:
+            # Invalid UTF-8 after the sniffed block: start over as latin1
+            return group_csv_rows(iter_csv_file_rows(filename, encoding='latin1', progress=progress))
+        
+    except OperationCancelled:
+        raise
+    except Exception as e:
+        raise Exception(f"Errore nel caricamento del CSV: {str(e)}")
+
+def _load_csv_file_timed(filename: str) -> Tuple[List[CourseEvent], float]:
+    # Top-level so that it can be pickled into worker processes
+    start = time.perf_counter()
+    if filename.lower().endswith('.ics'):
+        events = load_ics_events(filename)
+    else:
+        events = load_csv_events(filename)
+    return events, time.perf_counter() - start
+
+def _process_pool(workers: int):
+    # Imported here to keep the CLI cold start free of multiprocessing
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    
+    # spawn, not fork: the GUI starts pools from a worker thread, and a child
+    # forked from a threaded process can deadlock on a lock held by another thread
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+def _abandon_pool(executor, futures: Iterable):
+    # shutdown(cancel_futures=True) needs Python 3.9: pending work is cancelled by hand
+    for future in futures:
+        future.cancel()
+    executor.shutdown(wait=False)
+
+def load_csv_files(filenames: List[str], workers: Optional[int] = None,
+                   progress: Optional[ProgressCallback] = None
+                   ) -> Tuple[List[CourseEvent], List[Tuple[str, int, float]]]:
+    """Carica più CSV in parallelo con un pool di processi.
+    
+    Ogni file viene raggruppato per (Subject, Description) nel proprio processo;
+    gli eventi vengono uniti nell'ordine dei file tramite EventIndex. Restituisce anche, per ogni
+    file, (nome, numero di eventi, secondi di parsing).
+    """
+    results: Dict[str, Tuple[List[CourseEvent], float]] = {}
+    
+    if workers is None and len(filenames) > 1:
+        workers = min(len(filenames), os.cpu_count() or 1)
+    
+    if len(filenames) == 1 and not filenames[0].lower().endswith('.ics'):
+        # A single large file is split into chunks parsed in parallel instead
+        start = time.perf_counter()
+        events = load_csv_events_parallel(filenames[0], workers, progress)
+        results[filenames[0]] = events, time.perf_counter() - start
+    elif len(filenames) <= 1 or workers <= 1:
+        for done, filename in enumerate(filenames, 1):
+            results[filename] = _load_csv_file_timed(filename)
+            if progress is not None:
+                progress(done, len(filenames))
+    else:
+        from concurrent.futures import as_completed
+        
+        with _process_pool(workers) as executor:
+            futures = {executor.submit(_load_csv_file_timed, filename): filename
+                       for filename in filenames}
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    results[futures[future]] = future.result()
+                    if progress is not None:
+                        progress(done, len(filenames))
+            except BaseException:
+                _abandon_pool(executor, futures)
+                raise
+    
+    events = []
+    index = EventIndex(events)
+    timings = []
+    for filename in filenames:
+        file_events, seconds = results[filename]
+        # Files exported from overlapping sources share courses: merge, don't repeat
+        index.merge(file_events)
+        timings.append((filename, len(file_events), seconds))
+    
+    return events, timings
+
+def _count_quotes(mm: mmap.mmap, start: int, end: int) -> int:
+    count = 0
+    while start < end:
+        stop = min(end, start + SCAN_WINDOW_BYTES)
+        count += mm[start:stop].count(b'"')
+        start = stop
+    return count
+
+def _next_record_start(mm: mmap.mmap, pos: int, quotes: int) -> int:
+    """Primo inizio di record dopo pos; quotes = virgolette dall'ultimo confine noto a pos.
+    
+    Un a capo chiude un record solo se le virgolette che lo precedono sono in
+    numero pari, cioè se non si trova dentro un campo quotato.
+    """
+    size = len(mm)
+    while pos < size:
+        newline = mm.find(b'\n', pos)
+        if newline < 0:
+            return size
+        quotes += _count_quotes(mm, pos, newline + 1)
+        pos = newline + 1
+        if quotes % 2 == 0:
+            return pos
+    return size
+
+def split_csv_records(mm: mmap.mmap, n_chunks: int) -> Tuple[int, List[Tuple[int, int]]]:
+    """Divide il CSV in al più n_chunks intervalli di byte allineati ai confini di record.
+    
+    Restituisce la fine dell'intestazione e gli intervalli (inizio, fine) dei dati.
+    """
+    size = len(mm)
+    header_end = _next_record_start(mm, 0, 0)
+    bounds = [header_end]
+    
+    for i in range(1, n_chunks):
+        target = header_end + (size - header_end) * i // n_chunks
+        if target <= bounds[-1]:
+            continue
+        boundary = _next_record_start(mm, target, _count_quotes(mm, bounds[-1], target))
+        if boundary >= size:
+            break
+        bounds.append(boundary)
+    
+    bounds.append(size)
+    return header_end, [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+def _aggregate_csv_chunk(filename: str, start: int, end: int, encoding: str,
+                         fieldnames: List[str], date_format: Optional[str]
+                         ) -> Dict[Tuple[str, str], 'CourseAccumulator']:
+    # Runs in a worker process: partial per-course aggregates for one byte range
+    with open(filename, 'rb') as raw:
+        raw.seek(start)
+        text = raw.read(end - start).decode(encoding)
+    
+    reader = csv.DictReader(io.StringIO(text, newline=''), fieldnames=fieldnames)
+    return accumulate_csv_rows(reader, DateParser(date_format, parse_google_date))
+
+def _aggregate_csv_chunks(filename: str, chunks: List[Tuple[int, int]], encoding: str,
+                          fieldnames: List[str], date_format: Optional[str], workers: int,
+                          progress: Optional[ProgressCallback]) -> List[CourseEvent]:
+    from concurrent.futures import as_completed
+    
+    partials = [None] * len(chunks)
+    with _process_pool(workers) as executor:
+        futures = {executor.submit(_aggregate_csv_chunk, filename, start, end, encoding,
+                                   fieldnames, date_format): idx
+                   for idx, (start, end) in enumerate(chunks)}
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                partials[futures[future]] = future.result()
+                if progress is not None:
+                    progress(done, len(chunks))
+        except BaseException:
+            _abandon_pool(executor, futures)
+            raise
+    
+    # Merge in file order, so the first row of each course still decides its flags
+    event_groups: Dict[Tuple[str, str], CourseAccumulator] = {}
+    for chunk_groups in partials:
+        for key, accumulator in chunk_groups.items():
+            existing = event_groups.get(key)
+            if existing is None:
+                event_groups[key] = accumulator
+            else:
+                existing.merge(accumulator)
+    
+    return [accumulator.to_course_event() for accumulator in event_groups.values()]
+
+def load_csv_events_parallel(filename: str, workers: Optional[int] = None,
+                             progress: Optional[ProgressCallback] = None) -> List[CourseEvent]:
+    """Come load_csv_events, ma divide un CSV molto grande in blocchi analizzati in parallelo.
+    
+    Il file viene mappato in memoria e tagliato su confini di record (rispettando
+    gli a capo nei campi quotati); ogni processo restituisce aggregati parziali
+    per corso che vengono poi fusi. Sotto PARALLEL_MIN_BYTES si usa il percorso
+    sequenziale.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or os.path.getsize(filename) < PARALLEL_MIN_BYTES:
+        return load_csv_events(filename, progress)
+    
+    try:
+        with open(filename, 'rb') as raw, mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            block = mm[:ENCODING_SNIFF_BYTES]
+            encoding = sniff_encoding(block, final=len(block) < ENCODING_SNIFF_BYTES)
+            header_end, chunks = split_csv_records(mm, workers * CHUNKS_PER_WORKER)
+            header = mm[:header_end]
+            sample = mm[header_end:header_end + ENCODING_SNIFF_BYTES]
+        
+        try:
+            fieldnames = next(csv.reader([header.decode(encoding)]), [])
+            # The sample may end mid-record: it is only used to sniff the date format
+            sample_rows = csv.DictReader(io.StringIO(sample.decode(encoding, errors='ignore'), newline=''),
+                                         fieldnames=fieldnames)
+            date_format = sniff_date_format(row.get('Start Date') or ''
+                                            for row in islice(sample_rows, DATE_SNIFF_ROWS))
+            return _aggregate_csv_chunks(filename, chunks, encoding, fieldnames, date_format,
+                                         workers, progress)
+        except UnicodeDecodeError:
+            # Invalid UTF-8 in some chunk: the whole file is read as latin1, as in load_csv_events
+            fieldnames = next(csv.reader([header.decode('latin1')]), [])
+            return _aggregate_csv_chunks(filename, chunks, 'latin1', fieldnames, date_format,
+                                         workers, progress)
+        
+    except OperationCancelled:
+        raise
+    except Exception as e:
+        raise Exception(f"Errore nel caricamento del CSV: {str(e)}")
+
+class CourseAccumulator:
+    """Aggrega le righe CSV di un corso senza conservarle.
+    
+    Tiene solo data minima/massima, l'insieme delle sessioni uniche e i giorni
+    con almeno una riga, quindi la memoria cresce con il numero di corsi, di
+    orari e di giorni distinti, non di righe. Le settimane senza righe tra la
+    prima e l'ultima data diventano esclusioni del corso.
+    """
+    __slots__ = ('subject', 'description', 'all_day', 'is_private',
+                 'min_date', 'max_date', 'unique_sessions', 'dates', 'spans')
+    
+    def __init__(self, subject: str, description: str):
+        self.subject = subject
+        self.description = description
+        self.all_day = None
+        self.is_private = True
+        self.min_date = None
+        self.max_date = None
+        self.unique_sessions = set()
+        self.dates = set()
+        # (first ordinal, last ordinal, weekdays or None for every day, excluded ordinals)
+        self.spans = []
+    
+    def add(self, row: Dict, parse_date: Callable[[str], Optional[datetime]] = parse_google_date):
+        if self.all_day is None:
+            self.all_day = (row.get('All Day Event') or 'False').strip().lower() == 'true'
+            self.is_private = (row.get('Private') or 'True').strip().lower() == 'true'
+        
+        start_date_str = (row.get('Start Date') or '').strip()
+        if not start_date_str:
+            return
+        
+        # Google Calendar CSVs use MM/DD/YYYY unless the file says otherwise
+        date_obj = parse_date(start_date_str)
+        if not date_obj:
+            return
+        
+        if self.min_date is None or date_obj < self.min_date:
+            self.min_date = date_obj
+        if self.max_date is None or date_obj > self.max_date:
+            self.max_date = date_obj
+        self.dates.add(date_obj.toordinal())
+        
+        # Collected even for all-day courses so that partial aggregates
+        # from different chunks can be merged; dropped in to_course_event
+        start_time_str = (row.get('Start Time') or '').strip()
+        end_time_str = (row.get('End Time') or '').strip()
+        if start_time_str and end_time_str:
+            # Normalize location (remove extra spaces)
+            location = ' '.join((row.get('Location') or '').split())
+            
+            session_key = (date_obj.weekday(),  # 0=Monday, 6=Sunday
+                           parse_time_12h(start_time_str),
+                           parse_time_12h(end_time_str),
+                           location)
+            self.unique_sessions.add(session_key)
+    
+    def add_span(self, first: datetime, last: datetime, session_keys: Iterable[tuple] = (),
+                 all_day: bool = False, is_private: bool = True,
+                 excluded: Iterable[int] = (), weekdays: Optional[Iterable[int]] = None):
+        """Aggiunge un intervallo già aggregato (es. un VEVENT ricorrente) senza espanderlo.
+        
+        excluded sono gli ordinali delle occorrenze saltate (EXDATE); weekdays
+        i giorni coperti, di default quelli delle sessioni (o ogni giorno).
+        """
+        if self.all_day is None:
+            self.all_day = all_day
+            self.is_private = is_private
+        if self.min_date is None or first < self.min_date:
+            self.min_date = first
+        if self.max_date is None or last > self.max_date:
+            self.max_date = last
+        session_keys = list(session_keys)
+        self.unique_sessions.update(session_keys)
+        if weekdays is None and session_keys:
+            weekdays = (key[0] for key in session_keys)
+        weekdays = frozenset(weekdays) if weekdays is not None else None
+        self.spans.append((first.toordinal(), last.toordinal(), weekdays, frozenset(excluded)))
+    
+    def merge(self, other: 'CourseAccumulator'):
+        """Unisce l'aggregato parziale di righe successive (es. un altro blocco del file)"""
+        if self.all_day is None:
+            self.all_day = other.all_day
+            self.is_private = other.is_private
+        if other.min_date is not None:
+            if self.min_date is None or other.min_date < self.min_date:
+                self.min_date = other.min_date
+            if self.max_date is None or other.max_date > self.max_date:
+                self.max_date = other.max_date
+        self.unique_sessions |= other.unique_sessions
+        self.dates |= other.dates
+        self.spans += other.spans
+    
+    def missing_dates(self, start_ordinal: int, end_ordinal: int) -> Tuple[Tuple[int, int], ...]:
+        """Date attese (giorni delle sessioni, o ogni giorno) senza righe, come esclusioni"""
+        if self.all_day:
+            weekdays = range(7)
+            present = len(self.dates)
+        else:
+            weekdays = sorted({key[0] for key in self.unique_sessions})
+            present = sum(1 for ordinal in self.dates if (ordinal - 1) % 7 in weekdays)
+        expected = sum(count_weekday_occurrences(start_ordinal, end_ordinal, weekday)
+                       for weekday in weekdays)
+        if not self.spans and present == expected:
+            return ()
+        
+        ranges = []
+        run = None
+        for ordinal in sorted(ordinal for weekday in weekdays
+                              for ordinal in range(first_weekday_ordinal(start_ordinal, weekday),
+                                                   end_ordinal + 1, 7)):
+            covered = ordinal in self.dates or any(
+                first <= ordinal <= last and ordinal not in excluded
+                and (span_weekdays is None or (ordinal - 1) % 7 in span_weekdays)
+                for first, last, span_weekdays, excluded in self.spans)
+            if covered:
+                if run is not None:
+                    ranges.append(tuple(run))
+                    run = None
+            elif run is None:
+                run = [ordinal, ordinal]
+            else:
+                run[1] = ordinal
+        if run is not None:
+            ranges.append(tuple(run))
+        return tuple(ranges)
+    
+    def to_course_event(self) -> CourseEvent:
+        if self.min_date is None:
+            start_ordinal = date.today().toordinal()
+            end_ordinal = start_ordinal + 90
+        else:
+            start_ordinal = self.min_date.toordinal()
+            end_ordinal = self.max_date.toordinal()
+        
+        sessions = [
+            Session(weekday=weekday, start_time=start_time, end_time=end_time, location=location)
+            for weekday, start_time, end_time, location in sorted(self.unique_sessions)
+        ] if not self.all_day else []
+        
+        return CourseEvent.from_ordinals(
+            subject=self.subject,
+            description=self.description,
+            start_ordinal=start_ordinal,
+            end_ordinal=end_ordinal,
+            sessions=sessions,
+            is_private=self.is_private,
+            all_day=bool(self.all_day),
+            exclusions=self.missing_dates(start_ordinal, end_ordinal) if self.min_date else ()
+        )
+
+def csv_rows_to_course_event(subject: str, description: str, rows: List[Dict]) -> CourseEvent:
+    """Converte le righe CSV in un oggetto CourseEvent"""
+    accumulator = CourseAccumulator(subject, description)
+    parse_date = DateParser.sniff(row.get('Start Date') or '' for row in rows[:DATE_SNIFF_ROWS])
+    for row in rows:
+        accumulator.add(row, parse_date)
+    return accumulator.to_course_event()
+
+# Merging repeated imports
+class EventIndex:
+    """Indice hash su una lista di eventi per unire import ripetuti o sovrapposti.
+    
+    La chiave è (subject, description, giornata intera, privato). Un evento con
+    le stesse sessioni e un periodo sovrapposto ne allarga il periodo, e una
+    data resta esclusa solo se lo è in entrambi; uno con lo stesso periodo e
+    le stesse esclusioni ne unisce le sessioni. Se il risultato non cambia
+    niente l'evento è un duplicato. Negli altri casi restano corsi separati,
+    perché unirli genererebbe lezioni in date che nessuno dei due import
+    contiene. Ogni merge costa O(1) più le
+    sessioni e i corsi omonimi.
+    """
+    def __init__(self, events: List[CourseEvent]):
+        self.events = events
+        self._positions: Dict[tuple, List[int]] = {}
+        for position, event in enumerate(events):
+            self._positions.setdefault(self.merge_key(event), []).append(position)
+    
+    @staticmethod
+    def merge_key(event: CourseEvent) -> tuple:
+        return (event.subject, event.description, event.all_day, event.is_private)
+    
+    def add(self, event: CourseEvent) -> str:
+        """Aggiunge o unisce un evento; restituisce 'added', 'merged' o 'duplicate'"""
+        positions = self._positions.setdefault(self.merge_key(event), [])
+        for position in positions:
+            merged = self._merged(self.events[position], event)
+            if merged is None:
+                continue
+            if merged == self.events[position]:
+                return 'duplicate'
+            # A new object rather than an in-place edit, so caches keyed on
+            # identity or content see the change
+            self.events[position] = merged
+            return 'merged'
+        
+        positions.append(len(self.events))
+        self.events.append(event)
+        return 'added'
+    
+    @staticmethod
+    def _merged(existing: CourseEvent, event: CourseEvent) -> Optional[CourseEvent]:
+        """L'evento che unisce i due, o None se non si possono unire"""
+        known = {session.key() for session in existing.sessions}
+        if known == {session.key() for session in event.sessions}:
+            if event.start_ordinal > existing.end_ordinal or existing.start_ordinal > event.end_ordinal:
+                return None
+            start = min(existing.start_ordinal, event.start_ordinal)
+            end = max(existing.end_ordinal, event.end_ordinal)
+            # A date stays excluded only if no import has it: outside its own
+            # range each event counts as excluded
+            exclusions = intersect_exclusions(
+                _exclusions_within(existing, start, end), _exclusions_within(event, start, end))
+            return CourseEvent.from_ordinals(
+                existing.subject, existing.description, start, end,
+                existing.sessions, existing.is_private, existing.all_day, exclusions
+            )
+        
+        # The exclusions apply to every session of a course: sessions with
+        # different closures cannot share one
+        if ((existing.start_ordinal, existing.end_ordinal) != (event.start_ordinal, event.end_ordinal)
+                or existing.exclusions != event.exclusions):
+            return None
+        extra = []
+        for session in event.sessions:
+            session_key = session.key()
+            if session_key not in known:
+                known.add(session_key)
+                extra.append(session)
+        return CourseEvent.from_ordinals(
+            existing.subject, existing.description, existing.start_ordinal, existing.end_ordinal,
+            existing.sessions + extra, existing.is_private, existing.all_day, existing.exclusions
+        )
+    
+    def merge(self, events: Iterable[CourseEvent]) -> Dict[str, int]:
+        """Unisce più eventi e conta gli esiti per tipo"""
+        counts = {'added': 0, 'merged': 0, 'duplicate': 0}
+        for event in events:
+            counts[self.add(event)] += 1
+        return counts
+
+def merge_events(events: List[CourseEvent], new_events: Iterable[CourseEvent]) -> Dict[str, int]:
+    """Unisce new_events in events (modificata sul posto) senza duplicare i corsi"""
+    return EventIndex(events).merge(new_events)
+
+def occurrence_dedupe_keys(sources: List[Tuple[CourseEvent, Optional[Session]]]) -> List[Optional[tuple]]:
+    """Per ogni sorgente, la chiave delle righe che genera, o None se nessun'altra sorgente può produrle.
+    
+    Due sorgenti producono righe identiche nello stesso slot solo se hanno
+    stesso corso, flag, orari e luogo; solo queste vanno controllate in export.
+    """
+    keys = []
+    for event, session in sources:
+        keys.append((event.subject, event.description, event.is_private,
+                     None if session is None else session.key()))
+    
+    seen: Dict[tuple, int] = {}
+    for key in keys:
+        seen[key] = seen.get(key, 0) + 1
+    return [key if seen[key] > 1 else None for key in keys]
+
+def build_occurrence_streams(events: List[CourseEvent], window: Optional[Tuple[int, int]] = None
+                             ) -> Tuple[List[Tuple[CourseEvent, Optional[Session]]], List[range]]:
+    """Flussi cronologici di chiavi intere per ogni sessione o evento giornaliero.
+    
+    Ogni chiave codifica (ordinale data, minuti dalla mezzanotte, indice sorgente)
+    in un solo intero: ((ordinale * 1440) + minuti) * len(sources) + indice.
+    Per una sessione le chiavi formano una progressione aritmetica, quindi ogni
+    flusso è un semplice range e il merge confronta interi nativi; le date
+    escluse dividono la progressione in più range. L'indice sorgente rimanda a
+    (evento, sessione) e rende stabile l'ordinamento. Con window (ordinale
+    inizio, ordinale fine) il periodo di ogni corso viene tagliato alla
+    finestra, e i corsi fuori finestra saltati, prima di costruire i flussi.
+    """
+    sources = []
+    spans = []
+    
+    for event in events:
+        start = event.start_ordinal
+        end = event.end_ordinal
+        if window is not None:
+            start = max(start, window[0])
+            end = min(end, window[1])
+            if start > end:
+                continue
+        
+        if event.all_day:
+            sources.append((event, None))
+            spans.append((start, end, 0, 1))
+        else:
+            for session in event.sessions:
+                sources.append((event, session))
+                first = first_weekday_ordinal(start, session.weekday)
+                spans.append((first, end, session.start_minutes, 7))
+    
+    n = len(sources)
+    streams = []
+    for idx, (first, end, minutes, step) in enumerate(spans):
+        exclusions = sources[idx][0].exclusions
+        for gap_first, gap_end in (exclusion_gaps(first, end, step, exclusions)
+                                   if exclusions else ((first, end),)):
+            streams.append(range((gap_first * MINUTES_PER_DAY + minutes) * n + idx,
+                                 ((gap_end + 1) * MINUTES_PER_DAY) * n,
+                                 step * MINUTES_PER_DAY * n))
+    
+    return sources, streams
+
+def count_unique_occurrences(sources: List[Tuple[CourseEvent, Optional[Session]]],
+                             streams: List[range]) -> int:
+    """Chiavi dei flussi contando una volta le occorrenze identiche, senza generarle.
+    
+    Le sorgenti con la stessa chiave di deduplica hanno stesso giorno e orario,
+    quindi i loro range cadono sulla stessa griglia di slot: basta contare i
+    punti dell'unione dei tratti, in O(s log s) sui flussi.
+    """
+    n = len(sources)
+    dedupe_keys = occurrence_dedupe_keys(sources)
+    total = 0
+    # Dedupe key -> (first slot, last slot, step in slots) of its non-empty streams
+    shared: Dict[tuple, List[Tuple[int, int, int]]] = {}
+    for stream in streams:
+        if not stream:
+            continue
+        key = dedupe_keys[stream.start % n]
+        if key is None:
+            total += len(stream)
+        else:
+            shared.setdefault(key, []).append((stream.start // n, stream[-1] // n, stream.step // n))
+    
+    for segments in shared.values():
+        segments.sort()
+        counted_until = -1
+        for first, last, step in segments:
+            if first <= counted_until:
+                # Skip the slots already counted for an overlapping stream
+                first += -(-(counted_until + 1 - first) // step) * step
+            if first <= last:
+                total += (last - first) // step + 1
+                counted_until = max(counted_until, last)
+    return total
+
+def decode_occurrence_key(key: int, n_sources: int) -> Tuple[int, int, int]:
+    """Chiave intera -> (ordinale data, minuti dalla mezzanotte, indice sorgente)"""
+    slot, idx = divmod(key, n_sources)
+    ordinal, minutes = divmod(slot, MINUTES_PER_DAY)
+    return ordinal, minutes, idx
+
+def find_conflicts(events: Iterable[CourseEvent], same_location: bool = False
+                   ) -> List[Tuple[int, CourseEvent, Session, CourseEvent, Session]]:
+    """Sessioni che si sovrappongono nello stesso giorno della settimana e periodo.
+    
+    Restituisce (primo giorno in comune, evento, sessione, evento, sessione),
+    in ordine cronologico. Con same_location solo le sovrapposizioni nella
+    stessa aula. Per ogni giorno (e aula) una scansione sugli orari di inizio
+    tiene attive le sessioni non ancora finite, raggruppate per intervallo di
+    date: O(n log n) più le coppie trovate, senza confrontare ogni coppia.
+    Le date escluse dividono il periodo di una sessione in più tratti, quindi
+    due corsi si scontrano solo in una data in cui entrambi hanno lezione.
+    Sessioni che producono righe identiche (deduplicate in export) non sono
+    conflitti.
+    """
+    groups: Dict[object, list] = {}
+    for event in events:
+        if event.all_day:
+            continue
+        for session in event.sessions:
+            if session.end_minutes <= session.start_minutes:
+                continue
+            first = first_weekday_ordinal(event.start_ordinal, session.weekday)
+            rows_key = (event.subject, event.description, event.is_private, session.key())
+            group = (session.weekday, session.location) if same_location else session.weekday
+            items = groups.setdefault(group, [])
+            for gap_first, gap_end in exclusion_gaps(first, event.end_ordinal, 7, event.exclusions):
+                last = gap_first + (gap_end - gap_first) // 7 * 7
+                items.append((session.start_minutes, session.end_minutes, gap_first, last,
+                              rows_key, event, session))
+    
+    # (event, session, event, session) identities -> earliest common date;
+    # with exclusions the same pair can meet in several stretches
+    found: Dict[Tuple[int, int, int, int], int] = {}
+    conflicts = []
+    for items in groups.values():
+        items.sort(key=lambda item: item[0])
+        ending: List[Tuple[int, int, Tuple[int, int]]] = []
+        # (first, last) date span -> sessions still running at the sweep position
+        active: Dict[Tuple[int, int], Dict[int, tuple]] = {}
+        
+        for seq, item in enumerate(items):
+            start, end, first, last, rows_key, event, session = item
+            while ending and ending[0][0] <= start:
+                _, done, span = heapq.heappop(ending)
+                bucket = active[span]
+                del bucket[done]
+                if not bucket:
+                    del active[span]
+            
+            # Same weekday: the spans share a date exactly when they overlap
+            for (other_first, other_last), bucket in active.items():
+                if other_first > last or first > other_last:
+                    continue
+                clash = max(first, other_first)
+                for other in bucket.values():
+                    if other[4] == rows_key:
+                        continue
+                    pair = (id(other[5]), id(other[6]), id(event), id(session))
+                    position = found.get(pair)
+                    if position is None:
+                        found[pair] = len(conflicts)
+                        conflicts.append((clash, other[5], other[6], event, session))
+                    elif clash < conflicts[position][0]:
+                        conflicts[position] = (clash,) + conflicts[position][1:]
+            
+            heapq.heappush(ending, (end, seq, (first, last)))
+            active.setdefault((first, last), {})[seq] = item
+    
+    conflicts.sort(key=lambda conflict: (conflict[0], conflict[2].start_minutes,
+                                         conflict[4].start_minutes))
+    return conflicts
+
+def format_conflict(conflict: Tuple[int, CourseEvent, Session, CourseEvent, Session]) -> str:
+    ordinal, event_a, session_a, event_b, session_b = conflict
+    return (f"{format_italian_date(ordinal)} {WEEKDAYS_IT[session_a.weekday]}: "
+            f"{event_a.subject} {session_a.start_time}-{session_a.end_time} @ {session_a.location} ↔ "
+            f"{event_b.subject} {session_b.start_time}-{session_b.end_time} @ {session_b.location}")
+
+def format_csv_row(event: CourseEvent, session: Optional[Session], ordinal: int) -> Dict:
+    date_str = format_google_date(ordinal)
+    
+    if session is None:
+        return {
+            'Subject': event.subject,
+            'Start Date': date_str,
+            'Start Time': '',
+            'End Date': date_str,
+            'End Time': '',
+            'All Day Event': 'True',
+            'Description': event.description,
+            'Location': '',
+            'Private': 'True' if event.is_private else 'False'
+        }
+    
+    return {
+        'Subject': event.subject,
+        'Start Date': date_str,
+        'Start Time': TIME_12H_BY_MINUTES[session.start_minutes],
+        'End Date': date_str,
+        'End Time': TIME_12H_BY_MINUTES[session.end_minutes],
+        'All Day Event': 'False',
+        'Description': event.description,
+        'Location': session.location,
+        'Private': 'True' if event.is_private else 'False'
+    }
+
+def iter_occurrence_keys(sources: List[Tuple[CourseEvent, Optional[Session]]],
+                         streams: List[range]) -> Iterator[int]:
+    """Chiavi di occorrenza in ordine cronologico, senza le occorrenze duplicate"""
+    merged = heapq.merge(*streams)
+    dedupe_keys = occurrence_dedupe_keys(sources)
+    if not any(dedupe_keys):
+        # Common case: no two sources can collide, no per-row check needed
+        return merged
+    return _dedupe_occurrence_keys(merged, dedupe_keys, len(sources))
+
+def _dedupe_occurrence_keys(keys: Iterator[int], dedupe_keys: List[Optional[tuple]],
+                            n: int) -> Iterator[int]:
+    seen_slot = -1
+    seen = set()
+    for key in keys:
+        slot, idx = divmod(key, n)
+        dedupe = dedupe_keys[idx]
+        if dedupe is not None:
+            # Identical occurrences share a slot, so the set only spans one slot
+            if slot != seen_slot:
+                seen_slot = slot
+                seen = set()
+            if dedupe in seen:
+                continue
+            seen.add(dedupe)
+        yield key
+
+def iter_csv_rows(events: List[CourseEvent]) -> Iterator[Dict]:
+    """Genera le righe CSV in ordine cronologico senza materializzarle.
+    
+    Ogni flusso di sessione è già ordinato, quindi basta un merge a k vie:
+    la memoria occupata cresce con il numero di sessioni, non di occorrenze.
+    Le stringhe vengono formattate solo al momento della scrittura. Le
+    occorrenze identiche prodotte da eventi diversi vengono scritte una volta.
+    """
+    sources, streams = build_occurrence_streams(events)
+    n = len(sources)
+    
+    for key in iter_occurrence_keys(sources, streams):
+        ordinal, _, idx = decode_occurrence_key(key, n)
+        event, session = sources[idx]
+        yield format_csv_row(event, session, ordinal)
+
+def _csv_field(value: str) -> str:
+    # Rendered by csv.writer itself, so quoting matches the DictWriter path
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow((value, ''))
+    return buffer.getvalue()[:-len(',\r\n')]
+
+def csv_row_fragments(event: CourseEvent, session: Optional[Session]) -> Tuple[str, str, str]:
+    """Parti costanti della riga CSV di una sorgente: riga = testa + data + centro + data + coda.
+    
+    Subject, orari, All Day Event, Description, Location e Private non cambiano
+    tra le occorrenze di una sessione, quindi vengono quotati una volta sola.
+    """
+    if session is None:
+        start_time, end_time, all_day, location = '', '', 'True', ''
+    else:
+        start_time = TIME_12H_BY_MINUTES[session.start_minutes]
+        end_time = TIME_12H_BY_MINUTES[session.end_minutes]
+        all_day, location = 'False', session.location
+    private = 'True' if event.is_private else 'False'
+    
+    head = _csv_field(event.subject) + ','
+    middle = ',' + _csv_field(start_time) + ','
+    tail = ','.join(('', _csv_field(end_time), all_day, _csv_field(event.description),
+                     _csv_field(location), private)) + '\r\n'
+    return head, middle, tail
+
+def write_csv_lines(events: List[CourseEvent], output, progress: Optional[ProgressCallback] = None,
+                    total: int = 0, window: Optional[Tuple[int, int]] = None) -> int:
+    """Scrive le righe CSV (senza intestazione) su un file di testo aperto e ne restituisce il numero.
+    
+    Le righe vengono composte dai frammenti precalcolati di ogni sorgente e
+    scritte a blocchi di CSV_WRITE_BATCH_ROWS con un solo write(). Con window
+    (ordinale inizio, ordinale fine) si scrivono solo le occorrenze della
+    finestra, senza espandere il resto del calendario.
+    """
+    sources, streams = build_occurrence_streams(events, window)
+    n = len(sources)
+    fragments = [csv_row_fragments(event, session) for event, session in sources]
+    keys_per_day = MINUTES_PER_DAY * n
+    
+    count = 0
+    batch = []
+    current_day = -1
+    date_str = ''
+    
+    for key in iter_occurrence_keys(sources, streams):
+        day = key // keys_per_day
+        if day != current_day:
+            current_day = day
+            date_str = format_google_date(day)
+        head, middle, tail = fragments[key % n]
+        batch.append(head + date_str + middle + date_str + tail)
+        
+        if len(batch) == CSV_WRITE_BATCH_ROWS:
+            output.write(''.join(batch))
+            count += len(batch)
+            batch.clear()
+            if progress is not None:
+                progress(count, total)
+    
+    output.write(''.join(batch))
+    return count + len(batch)
+
+@lru_cache(maxsize=1)
+def numpy_available() -> bool:
+    """NumPy è una dipendenza facoltativa: senza, si usa il backend Python"""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def write_csv_lines_numpy(events: List[CourseEvent], output,
+                          progress: Optional[ProgressCallback] = None, total: int = 0) -> int:
+    """Come write_csv_lines, ma espande le occorrenze con NumPy; richiede numpy.
+    
+    Ogni sorgente diventa un arange settimanale (o giornaliero) di datetime64;
+    le chiavi intere di tutte le occorrenze vengono ordinate in blocco e le
+    date formattate una volta per giorno distinto. Produce lo stesso file.
+    """
+    import numpy as np
+    
+    sources, _ = build_occurrence_streams(events)
+    n = len(sources)
+    if not n:
+        return 0
+    
+    epoch = date(1970, 1, 1).toordinal()
+    minutes = np.zeros(n, dtype=np.int64)
+    day_arrays = []
+    idx_arrays = []
+    for idx, (event, session) in enumerate(sources):
+        if session is None:
+            first, step = event.start_ordinal, 1
+        else:
+            first, step = first_weekday_ordinal(event.start_ordinal, session.weekday), 7
+            minutes[idx] = session.start_minutes
+        for gap_first, gap_end in exclusion_gaps(first, event.end_ordinal, step, event.exclusions):
+            days = np.arange(np.datetime64(gap_first - epoch, 'D'),
+                             np.datetime64(gap_end + 1 - epoch, 'D'),
+                             np.timedelta64(step, 'D')).astype(np.int64)
+            day_arrays.append(days)
+            idx_arrays.append(np.full(len(days), idx, dtype=np.int64))
+    if not day_arrays:
+        return 0
+    
+    # Same packed key as build_occurrence_streams, with days counted from 1970
+    idxs = np.concatenate(idx_arrays)
+    keys = np.sort((np.concatenate(day_arrays) * MINUTES_PER_DAY + minutes[idxs]) * n + idxs)
+    slots, idxs = np.divmod(keys, n)
+    
+    dedupe_keys = occurrence_dedupe_keys(sources)
+    if any(dedupe_keys):
+        # Keep the first source of every (slot, identical rows) pair, as iter_occurrence_keys does
+        group_ids: Dict[tuple, int] = {}
+        groups = np.array([group_ids.setdefault(key if key is not None else (idx,), len(group_ids))
+                           for idx, key in enumerate(dedupe_keys)], dtype=np.int64)
+        _, first = np.unique(slots * len(group_ids) + groups[idxs], return_index=True)
+        keep = np.zeros(len(keys), dtype=bool)
+        keep[first] = True
+        slots, idxs = slots[keep], idxs[keep]
+    
+    days, day_index = np.unique(slots // MINUTES_PER_DAY, return_inverse=True)
+    dates = np.array([format_google_date(int(day) + epoch) for day in days], dtype=object)
+    fragments = [csv_row_fragments(event, session) for event, session in sources]
+    heads = np.array([head for head, _, _ in fragments], dtype=object)
+    middles = np.array([middle for _, middle, _ in fragments], dtype=object)
+    tails = np.array([tail for _, _, tail in fragments], dtype=object)
+    
+    count = len(idxs)
+    for start in range(0, count, CSV_WRITE_BATCH_ROWS):
+        batch = idxs[start:start + CSV_WRITE_BATCH_ROWS]
+        date_strs = dates[day_index[start:start + CSV_WRITE_BATCH_ROWS]]
+        lines = heads[batch] + date_strs + middles[batch] + date_strs + tails[batch]
+        output.write(''.join(lines.tolist()))
+        if progress is not None and start + len(batch) < count:
+            progress(start + len(batch), total)
+    
+    return count
+
+def generate_csv_rows(events: List[CourseEvent]) -> List[Dict]:
+    """Espande gli eventi in righe CSV Google Calendar ordinate per data"""
+    return list(iter_csv_rows(events))
+
+def write_csv(events: List[CourseEvent], filename: str,
+              progress: Optional[ProgressCallback] = None,
+              compress: Optional[bool] = None, backend: str = 'auto',
+              window: Optional[Tuple[int, int]] = None) -> int:
+    """Scrive il CSV Google Calendar in streaming e restituisce il numero di righe.
+    
+    Con compress (di default se il nome termina in .gz) l'output è gzip.
+    backend: 'python', 'numpy' o 'auto' (NumPy oltre NUMPY_MIN_ROWS righe);
+    senza NumPy installato si usa sempre il backend Python.
+    window (ordinale inizio, ordinale fine) limita l'export a quelle date.
+    Se l'operazione viene annullata il file parziale viene rimosso.
+    """
+    if compress is None:
+        compress = filename.lower().endswith('.gz')
+    
+    if window is not None:
+        total = count_total_occurrences(events, window)
+        write_lines = partial(write_csv_lines, window=window)
+    else:
+        total = count_total_occurrences(events)
+        write_lines = write_csv_lines
+        if backend != 'python' and numpy_available():
+            if backend == 'numpy' or total >= NUMPY_MIN_ROWS:
+                write_lines = write_csv_lines_numpy
+    
+    try:
+        if compress:
+            csvfile = gzip.open(filename, 'wt', compresslevel=GZIP_LEVEL,
+                                newline='', encoding='utf-8')
+        else:
+            csvfile = open(filename, 'w', newline='', encoding='utf-8')
+        with csvfile:
+            csv.writer(csvfile).writerow(CSV_HEADERS)
+            count = write_lines(events, csvfile, progress, total)
+    except OperationCancelled:
+        os.remove(filename)
+        raise
+    
+    if progress is not None:
+        progress(count, total)
+    return count
+
+# iCalendar export
+ICS_PRODID = "-//Google Calendar CSV Generator//IT"
+ICS_LINE_OCTETS = 75
+
+def ics_escape(text: str) -> str:
+    """Escape di un valore TEXT iCalendar (RFC 5545, 3.3.11)"""
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n').replace('\r', '\\n'))
+
+def fold_ics_line(line: str) -> str:
+    """Spezza una riga di contenuto in righe da al più 75 byte UTF-8, terminate da CRLF"""
+    if len(line) <= ICS_LINE_OCTETS // 4 or len(line.encode('utf-8')) <= ICS_LINE_OCTETS:
+        return line + '\r\n'
+    
+    parts = []
+    current = ''
+    size = 0
+    limit = ICS_LINE_OCTETS
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > limit:
+            parts.append(current)
+            # Continuation lines start with a space, which counts towards the limit
+            current = ''
+            size = 0
+            limit = ICS_LINE_OCTETS - 1
+        current += char
+        size += char_size
+    parts.append(current)
+    return '\r\n '.join(parts) + '\r\n'
+
+def _ics_date(ordinal: int) -> str:
+    return date.fromordinal(ordinal).strftime('%Y%m%d')
+
+def _ics_datetime(ordinal: int, minutes: int) -> str:
+    # Floating local time, like the times in the Google CSV
+    return f"{_ics_date(ordinal)}T{minutes // 60:02d}{minutes % 60:02d}00"
+
+def ics_event_lines(event: CourseEvent, stamp: str) -> List[str]:
+    """VEVENT di un corso: uno per sessione con RRULE settimanale, uno solo se giornaliero.
+    
+    Le date escluse diventano EXDATE della regola; un corso giornaliero ha un
+    evento per ogni tratto tra le chiusure.
+    """
+    # Exclusions are left out of the UID, so editing them updates the same series
+    base_uid = hashlib.sha1(repr(event.content_key()[:-1]).encode('utf-8')).hexdigest()[:16]
+    common = [f"SUMMARY:{ics_escape(event.subject)}"]
+    if event.description:
+        common.append(f"DESCRIPTION:{ics_escape(event.description)}")
+    common.append(f"CLASS:{'PRIVATE' if event.is_private else 'PUBLIC'}")
+    
+    lines = []
+    if event.all_day:
+        gaps = exclusion_gaps(event.start_ordinal, event.end_ordinal, 1, event.exclusions)
+        for idx, (first, last) in enumerate(gaps):
+            # One ranged event per stretch; DTEND of an all-day event is exclusive
+            suffix = f"-{idx}" if idx else ""
+            lines += ['BEGIN:VEVENT', f"UID:{base_uid}{suffix}@google-calendar-csv-generator",
+                      f"DTSTAMP:{stamp}",
+                      f"DTSTART;VALUE=DATE:{_ics_date(first)}",
+                      f"DTEND;VALUE=DATE:{_ics_date(last + 1)}",
+                      *common, 'END:VEVENT']
+        return lines
+    
+    seen = set()
+    for idx, session in enumerate(event.sessions):
+        key = session.key()
+        gaps = exclusion_gaps(first_weekday_ordinal(event.start_ordinal, session.weekday),
+                              event.end_ordinal, 7, event.exclusions)
+        if key in seen or not gaps:
+            continue
+        seen.add(key)
+        first = gaps[0][0]
+        last = gaps[-1][0] + (gaps[-1][1] - gaps[-1][0]) // 7 * 7
+        # The weeks skipped between stretches
+        skipped = [ordinal for (_, end), (start, _) in zip(gaps, gaps[1:])
+                   for ordinal in range(end - (end - first) % 7 + 7, start, 7)]
+        
+        lines += ['BEGIN:VEVENT', f"UID:{base_uid}-{idx}@google-calendar-csv-generator",
+                  f"DTSTAMP:{stamp}",
+                  f"DTSTART:{_ics_datetime(first, session.start_minutes)}",
+                  f"DTEND:{_ics_datetime(first, session.end_minutes)}",
+                  f"RRULE:FREQ=WEEKLY;UNTIL={_ics_datetime(last, session.start_minutes)}",
+                  *common]
+        if skipped:
+            lines.append("EXDATE:" + ','.join(_ics_datetime(ordinal, session.start_minutes)
+                                              for ordinal in skipped))
+        if session.location:
+            lines.append(f"LOCATION:{ics_escape(session.location)}")
+        lines.append('END:VEVENT')
+    return lines
+
+def write_ics(events: List[CourseEvent], filename: str,
+              progress: Optional[ProgressCallback] = None) -> int:
+    """Scrive un file iCalendar compatto e restituisce il numero di VEVENT.
+    
+    Ogni sessione diventa un solo evento ricorrente, quindi la dimensione cresce
+    con le sessioni e non con le settimane. Se l'operazione viene annullata il
+    file parziale viene rimosso.
+    """
+    stamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    count = 0
+    
+    try:
+        with open(filename, 'w', newline='', encoding='utf-8') as icsfile:
+            icsfile.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\n'
+                          f"PRODID:{ICS_PRODID}\r\nCALSCALE:GREGORIAN\r\n")
+            for done, event in enumerate(events, 1):
+                lines = ics_event_lines(event, stamp)
+                icsfile.write(''.join(fold_ics_line(line) for line in lines))
+                count += lines.count('BEGIN:VEVENT')
+                if progress is not None and done % PROGRESS_EVERY_EVENTS == 0:
+                    progress(done, len(events))
+            icsfile.write('END:VCALENDAR\r\n')
+    except OperationCancelled:
+        os.remove(filename)
+        raise
+    
+    if progress is not None:
+        progress(len(events), len(events))
+    return count
+
+# iCalendar import
+ICS_WEEKDAYS = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
+# Rules without an end get this horizon; rules that cannot be a Session
+# (monthly, every other week, ...) expand at most ICS_MAX_EXPANDED occurrences
+ICS_OPEN_RRULE_DAYS = 365
+ICS_MAX_EXPANDED = 5000
+_ICS_ESCAPES = {'n': '\n', 'N': '\n', ',': ',', ';': ';', '\\': '\\'}
+_ICS_DURATION = re.compile(r'([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+def ics_unescape(text: str) -> str:
+    if '\\' not in text:
+        return text
+    return re.sub(r'\\(.)', lambda match: _ICS_ESCAPES.get(match.group(1), match.group(1)), text)
+
+def iter_ics_unfolded(lines: Iterable[str]) -> Iterator[str]:
+    """Righe logiche di un file iCalendar, riunendo le righe piegate"""
+    pending = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t'):
+            if pending is not None:
+                pending += line[1:]
+            continue
+        if pending:
+            yield pending
+        pending = line
+    if pending:
+        yield pending
+
+def parse_ics_property(line: str) -> Tuple[str, Dict[str, str], str]:
+    """"NOME;PARAM=valore:contenuto" -> (NOME, parametri, contenuto)"""
+    colon = line.find(':')
+    quote = line.find('"')
+    if 0 <= quote < colon:
+        # A quoted parameter value may itself contain ':'
+        in_quotes = False
+        for pos, char in enumerate(line):
+            if char == '"':
+                in_quotes = not in_quotes
+            elif char == ':' and not in_quotes:
+                colon = pos
+                break
+    if colon < 0:
+        return line.upper(), {}, ''
+    
+    name, *params = line[:colon].split(';')
+    parameters = {}
+    for param in params:
+        key, _, value = param.partition('=')
+        parameters[key.upper()] = value.strip('"')
+    return name.upper(), parameters, line[colon + 1:]
+
+def iter_ics_vevents(lines: Iterable[str]) -> Iterator[Dict[str, Tuple[Dict[str, str], str]]]:
+    """Proprietà di ogni VEVENT, un evento alla volta (VALARM e simili sono ignorati)"""
+    event = None
+    depth = 0
+    for line in iter_ics_unfolded(lines):
+        name, params, value = parse_ics_property(line)
+        if name == 'BEGIN':
+            if event is not None:
+                depth += 1
+            elif value.upper() == 'VEVENT':
+                event = {}
+        elif name == 'END':
+            if depth:
+                depth -= 1
+            elif event is not None and value.upper() == 'VEVENT':
+                yield event
+                event = None
+        elif event is not None and not depth:
+            if name == 'EXDATE' and name in event:
+                # EXDATE may be repeated; its values are a comma-separated list anyway
+                event[name] = (event[name][0], event[name][1] + ',' + value)
+            else:
+                event.setdefault(name, (params, value))
+
+def parse_ics_datetime(value: str, params: Optional[Dict[str, str]] = None) -> Tuple[datetime, bool]:
+    """Valore DATE o DATE-TIME -> (datetime locale, solo data); gli orari UTC sono convertiti in locale"""
+    value = value.strip()
+    moment = datetime(int(value[:4]), int(value[4:6]), int(value[6:8]))
+    if len(value) < 15 or (params or {}).get('VALUE') == 'DATE':
+        return moment, True
+    
+    moment = moment.replace(hour=int(value[9:11]), minute=int(value[11:13]),
+                            second=int(value[13:15]))
+    if value.endswith('Z'):
+        # TZID times are kept as wall-clock times, like the CSV does
+        moment = moment.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return moment, False
+
+def parse_ics_duration(value: str) -> timedelta:
+    match = _ICS_DURATION.match(value.strip().upper())
+    if not match:
+        raise ValueError(f"Durata non valida: {value}")
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                         minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -duration if sign == '-' else duration
+
+def parse_rrule(value: str) -> Dict[str, str]:
+    rule = {}
+    for part in value.split(';'):
+        key, _, part_value = part.partition('=')
+        rule[key.strip().upper()] = part_value.strip().upper()
+    return rule
+
+def _rrule_weekdays(rule: Dict[str, str], start: datetime) -> Optional[List[int]]:
+    """Giorni di BYDAY, o None se hanno prefissi numerici (es. 2MO) non rappresentabili"""
+    if 'BYDAY' not in rule:
+        return [start.weekday()]
+    weekdays = []
+    for code in rule['BYDAY'].split(','):
+        if code not in ICS_WEEKDAYS:
+            return None
+        weekdays.append(ICS_WEEKDAYS[code])
+    return sorted(set(weekdays))
+
+def _rrule_last_ordinal(rule: Dict[str, str], start: datetime, weekdays: List[int]) -> int:
+    """Ultimo giorno coperto da una regola settimanale, senza espanderla"""
+    start_ordinal = start.toordinal()
+    if 'UNTIL' in rule:
+        until, is_date = parse_ics_datetime(rule['UNTIL'])
+        last = until.toordinal()
+        if not is_date and until < datetime.combine(until.date(), start.time()):
+            last -= 1
+        return last
+    
+    if 'COUNT' in rule:
+        # Smallest last day holding COUNT occurrences, by bisection on the O(1) counts
+        count = int(rule['COUNT'])
+        low, high = start_ordinal, start_ordinal + 7 * count
+        while low < high:
+            middle = (low + high) // 2
+            if sum(count_weekday_occurrences(start_ordinal, middle, weekday)
+                   for weekday in weekdays) >= count:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+    
+    return start_ordinal + ICS_OPEN_RRULE_DAYS
+
+def _iter_rrule_dates(rule: Dict[str, str], start: datetime) -> Iterator[datetime]:
+    """Espansione limitata delle regole che non diventano una Session settimanale"""
+    freq = rule.get('FREQ')
+    interval = max(1, int(rule.get('INTERVAL') or 1))
+    count = int(rule['COUNT']) if 'COUNT' in rule else None
+    if 'UNTIL' in rule:
+        until = parse_ics_datetime(rule['UNTIL'])[0]
+    else:
+        until = start + timedelta(days=ICS_OPEN_RRULE_DAYS)
+    weekdays = _rrule_weekdays(rule, start) if freq == 'WEEKLY' else None
+    
+    produced = 0
+    step = 0
+    while produced < ICS_MAX_EXPANDED and (count is None or produced < count):
+        if freq == 'DAILY':
+            candidates = [start + timedelta(days=step * interval)]
+        elif freq == 'WEEKLY' and weekdays:
+            week = start + timedelta(days=7 * step * interval - start.weekday())
+            candidates = [week + timedelta(days=weekday) for weekday in weekdays]
+        elif freq in ('MONTHLY', 'YEARLY'):
+            months = step * interval * (12 if freq == 'YEARLY' else 1)
+            year, month = divmod(start.month - 1 + months, 12)
+            try:
+                candidates = [start.replace(year=start.year + year, month=month + 1)]
+            except ValueError:
+                # The 31st (or 29 February) does not exist in this month: skipped, as in RFC 5545
+                candidates = []
+        else:
+            candidates = [start] if step == 0 else []
+        
+        if step and not candidates and freq not in ('MONTHLY', 'YEARLY'):
+            return
+        for moment in candidates:
+            if moment < start:
+                continue
+            if moment > until or (count is not None and produced >= count):
+                return
+            yield moment
+            produced += 1
+        step += 1
+
+def _ics_row(props: Dict[str, Tuple[Dict[str, str], str]], moment: datetime, end: datetime,
+             all_day: bool, is_private: bool) -> Dict:
+    # Same shape as a Google CSV row, for CourseAccumulator.add
+    return {
+        'Start Date': format_google_date(moment.toordinal()),
+        'Start Time': '' if all_day else format_time_12h(moment.strftime('%H:%M')),
+        'End Time': '' if all_day else format_time_12h(end.strftime('%H:%M')),
+        'All Day Event': 'True' if all_day else 'False',
+        'Location': ics_unescape(props.get('LOCATION', ({}, ''))[1]),
+        'Private': 'True' if is_private else 'False',
+    }
+
+def _ics_accumulator(event_groups: Dict[Tuple[str, str], 'CourseAccumulator'],
+                     props: Dict[str, Tuple[Dict[str, str], str]]) -> 'CourseAccumulator':
+    subject = ics_unescape(props.get('SUMMARY', ({}, ''))[1]).strip()
+    description = ics_unescape(props.get('DESCRIPTION', ({}, ''))[1]).strip()
+    key = (subject, description)
+    accumulator = event_groups.get(key)
+    if accumulator is None:
+        accumulator = event_groups[key] = CourseAccumulator(subject, description)
+    return accumulator
+
+def ics_recurrence_ordinal(props: Dict[str, Tuple[Dict[str, str], str]]) -> Optional[int]:
+    """Giorno dell'occorrenza sostituita da un VEVENT con RECURRENCE-ID, o None"""
+    if 'RECURRENCE-ID' not in props:
+        return None
+    params, value = props['RECURRENCE-ID']
+    return parse_ics_datetime(value, params)[0].toordinal()
+
+def add_ics_vevent(event_groups: Dict[Tuple[str, str], 'CourseAccumulator'],
+                   props: Dict[str, Tuple[Dict[str, str], str]], moved: Iterable[int] = ()):
+    """Aggiunge un VEVENT agli aggregati per (SUMMARY, DESCRIPTION).
+    
+    Una regola settimanale (o giornaliera) diventa direttamente una Session,
+    senza espandere le occorrenze; gli eventi singoli passano dalla stessa
+    aggregazione delle righe CSV. moved sono i giorni delle occorrenze della
+    regola sostituite da un VEVENT con RECURRENCE-ID, saltate come gli EXDATE.
+    """
+    if 'DTSTART' not in props:
+        return
+    is_private = props.get('CLASS', ({}, 'PRIVATE'))[1].strip().upper() != 'PUBLIC'
+    
+    start, all_day = parse_ics_datetime(props['DTSTART'][1], props['DTSTART'][0])
+    if 'DTEND' in props:
+        end = parse_ics_datetime(props['DTEND'][1], props['DTEND'][0])[0]
+    elif 'DURATION' in props:
+        end = start + parse_ics_duration(props['DURATION'][1])
+    else:
+        end = start + timedelta(days=1) if all_day else start
+    
+    accumulator = _ics_accumulator(event_groups, props)
+    
+    rule = parse_rrule(props['RRULE'][1]) if 'RRULE' in props else None
+    excluded = set(moved)
+    if 'EXDATE' in props:
+        params, value = props['EXDATE']
+        excluded.update(parse_ics_datetime(item, params)[0].toordinal()
+                        for item in value.split(',') if item.strip())
+    
+    if rule is None:
+        if all_day:
+            # A ranged all-day event covers [DTSTART, DTEND)
+            last = max(start, end - timedelta(days=1))
+            accumulator.add_span(start, last, all_day=True, is_private=is_private)
+        else:
+            accumulator.add(_ics_row(props, start, end, all_day, is_private))
+        return
+    
+    freq = rule.get('FREQ')
+    weekdays = _rrule_weekdays(rule, start)
+    simple = (rule.get('INTERVAL') in (None, '1') and weekdays is not None
+              and not any(part in rule for part in ('BYSETPOS', 'BYMONTH', 'BYMONTHDAY',
+                                                    'BYYEARDAY', 'BYWEEKNO', 'BYHOUR')))
+    if simple and freq == 'DAILY' and 'BYDAY' not in rule:
+        weekdays = list(range(7))
+    
+    if simple and freq in ('WEEKLY', 'DAILY'):
+        last_ordinal = _rrule_last_ordinal(rule, start, weekdays)
+        last = datetime.fromordinal(last_ordinal)
+        # A short rule (e.g. daily for three days) does not reach every weekday
+        weekdays = [weekday for weekday in weekdays
+                    if count_weekday_occurrences(start.toordinal(), last_ordinal, weekday)]
+        if all_day:
+            session_keys = ()
+        else:
+            location = ' '.join(ics_unescape(props.get('LOCATION', ({}, ''))[1]).split())
+            start_time = HHMM_BY_MINUTES[start.hour * 60 + start.minute]
+            end_time = HHMM_BY_MINUTES[end.hour * 60 + end.minute]
+            session_keys = [(weekday, start_time, end_time, location) for weekday in weekdays]
+        # An all-day rule has no sessions, but still covers only its weekdays
+        accumulator.add_span(start, last, session_keys, all_day, is_private, excluded, weekdays)
+        return
+    
+    duration = end - start
+    for moment in _iter_rrule_dates(rule, start):
+        if moment.toordinal() in excluded:
+            continue
+        accumulator.add(_ics_row(props, moment, moment + duration, all_day, is_private))
+
+def load_ics_events(filename: str, progress: Optional[ProgressCallback] = None) -> List[CourseEvent]:
+    """Carica eventi da un file iCalendar (.ics), leggendolo riga per riga"""
+    try:
+        try:
+            return _load_ics_events(filename, 'utf-8-sig', progress)
+        except UnicodeDecodeError:
+            return _load_ics_events(filename, 'latin1', progress)
+        
+    except OperationCancelled:
+        raise
+    except Exception as e:
+        raise Exception(f"Errore nel caricamento dell'ICS: {str(e)}")
+
+def _load_ics_events(filename: str, encoding: str,
+                     progress: Optional[ProgressCallback]) -> List[CourseEvent]:
+    event_groups: Dict[Tuple[str, str], CourseAccumulator] = {}
+    # An override may come before or after its series: rules are added at
+    # the end, once the days moved by RECURRENCE-ID are known for every UID
+    rules = []
+    moved: Dict[str, set] = {}
+    with open(filename, 'rb') as raw:
+        size = os.fstat(raw.fileno()).st_size
+        with io.TextIOWrapper(raw, encoding=encoding, newline='') as icsfile:
+            for count, props in enumerate(iter_ics_vevents(icsfile), 1):
+                recurrence = ics_recurrence_ordinal(props)
+                if recurrence is not None:
+                    if 'UID' in props:
+                        moved.setdefault(props['UID'][1], set()).add(recurrence)
+                    # The override is the instance itself, never a series
+                    props.pop('RRULE', None)
+                    add_ics_vevent(event_groups, props)
+                elif 'RRULE' in props and 'DTSTART' in props:
+                    # Keeps the course order of the file
+                    _ics_accumulator(event_groups, props)
+                    rules.append(props)
+                else:
+                    add_ics_vevent(event_groups, props)
+                if progress is not None and count % PROGRESS_EVERY_EVENTS == 0:
+                    progress(raw.tell(), size)
+    
+    for props in rules:
+        add_ics_vevent(event_groups, props, moved.get(props['UID'][1], ()) if 'UID' in props else ())
+    
+    if progress is not None:
+        progress(size, size)
+    return [accumulator.to_course_event() for accumulator in event_groups.values()]
+
+# Configuration
+def apply_exclusions(events: List[CourseEvent],
+                     exclusions: Tuple[Tuple[int, int], ...]) -> List[CourseEvent]:
+    """Eventi da espandere con anche le chiusure globali, senza modificare quelli salvati.
+    
+    Le chiusure globali restano separate dai corsi (configurazione, GUI) e si
+    aggiungono alle esclusioni di ognuno solo per export, conteggi e conflitti.
+    """
+    if not exclusions:
+        return events
+    return [CourseEvent.from_ordinals(event.subject, event.description, event.start_ordinal,
+                                      event.end_ordinal, event.sessions, event.is_private,
+                                      event.all_day, event.exclusions + exclusions)
+            for event in events]
+
+def exclusions_to_config(exclusions: Iterable[Tuple[int, int]]) -> List[List[str]]:
+    return [[format_italian_date(start), format_italian_date(end)] for start, end in exclusions]
+
+def exclusions_from_config(items: Iterable) -> Tuple[Tuple[int, int], ...]:
+    """Voci "DD/MM/YYYY" o ["DD/MM/YYYY", "DD/MM/YYYY"] -> intervalli di ordinali"""
+    ranges = []
+    for item in items:
+        start, end = (item, item) if isinstance(item, str) else item
+        ranges.append((_event_ordinal(start), _event_ordinal(end)))
+    return normalize_exclusions(ranges)
+
+def parse_exclusions(text: str) -> Tuple[Tuple[int, int], ...]:
+    """Testo "24/12/2025-06/01/2026, 08/12/2025" -> intervalli di ordinali"""
+    ranges = []
+    for part in re.split(r'[,;\n]', text):
+        part = part.strip()
+        if not part:
+            continue
+        single = parse_date_flexible(part)
+        if single is not None:
+            ranges.append((single.toordinal(), single.toordinal()))
+            continue
+        bounds = [parse_date_flexible(bound.strip()) for bound in part.split('-')]
+        if len(bounds) != 2 or None in bounds or bounds[1] < bounds[0]:
+            raise ValueError(f"Data o intervallo non valido: {part}")
+        ranges.append((bounds[0].toordinal(), bounds[1].toordinal()))
+    return normalize_exclusions(ranges)
+
+def format_exclusions(exclusions: Iterable[Tuple[int, int]]) -> str:
+    return ', '.join(format_italian_date(start) if start == end
+                     else f"{format_italian_date(start)}-{format_italian_date(end)}"
+                     for start, end in exclusions)
+
+def events_to_config(events: List[CourseEvent],
+                     exclusions: Tuple[Tuple[int, int], ...] = ()) -> Dict:
+    """Converte gli eventi nel dizionario della configurazione JSON.
+    
+    Le chiusure globali sono salvate una volta in 'exclusions'; ogni corso
+    tiene solo le proprie.
+    """
+    config = {
+        'exclusions': exclusions_to_config(exclusions),
+        'events': []
+    }
+    
+    for event in events:
+        event_dict = {
+            'subject': event.subject,
+            'description': event.description,
+            'start_date': event.start_date,
+            'end_date': event.end_date,
+            'is_private': event.is_private,
+            'all_day': event.all_day,
+            'sessions': [
+                {
+                    'weekday': s.weekday,
+                    'start_time': s.start_time,
+                    'end_time': s.end_time,
+                    'location': s.location
+                }
+                for s in event.sessions
+            ],
+            'exclusions': exclusions_to_config(event.exclusions)
+        }
+        config['events'].append(event_dict)
+    
+    return config
+
+def config_to_events(config: Dict, progress: Optional[ProgressCallback] = None
+                     ) -> Tuple[List[CourseEvent], Tuple[Tuple[int, int], ...]]:
+    """Ricostruisce gli eventi e le chiusure globali ('exclusions') dal dizionario della configurazione JSON"""
+    events = []
+    total = len(config['events'])
+    
+    for count, event_dict in enumerate(config['events'], 1):
+        if progress is not None and count % PROGRESS_EVERY_ROWS == 0:
+            progress(count, total)
+        
+        sessions = []
+        for s_dict in event_dict.get('sessions', []):
+            sessions.append(Session(
+                weekday=s_dict['weekday'],
+                start_time=s_dict['start_time'],
+                end_time=s_dict['end_time'],
+                location=s_dict['location']
+            ))
+        
+        event = CourseEvent(
+            subject=event_dict['subject'],
+            description=event_dict['description'],
+            start_date=event_dict['start_date'],
+            end_date=event_dict['end_date'],
+            sessions=sessions,
+            is_private=event_dict.get('is_private', True),
+            all_day=event_dict.get('all_day', False),
+            exclusions=exclusions_from_config(event_dict.get('exclusions', []))
+        )
+        events.append(event)
+    
+    return events, exclusions_from_config(config.get('exclusions', []))
+
+def save_config_file(events: List[CourseEvent], filename: str,
+                     exclusions: Tuple[Tuple[int, int], ...] = ()):
+    if filename.lower().endswith(COMPACT_CONFIG_EXTENSION):
+        save_compact_config(events, filename, exclusions)
+        return
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(events_to_config(events, exclusions), f, indent=2)
+
+def load_config_file(filename: str, progress: Optional[ProgressCallback] = None
+                     ) -> Tuple[List[CourseEvent], Tuple[Tuple[int, int], ...]]:
+    """Eventi e chiusure globali di una configurazione JSON o compatta"""
+    if filename.lower().endswith(COMPACT_CONFIG_EXTENSION):
+        return load_compact_config(filename, progress)
+    with open(filename, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return config_to_events(config, progress)
+
+# Compact configuration: one JSON array per line, with dates as ordinals and
+# times as minutes, then the byte offset of every line. The fixed-width
+# header points at the index, so any event can be read without the others:
+#   {"format":...,"version":3,"count":N,"index_offset":O,"exclusions":[[start, end], ...]}
+#   [subject, description, start_ordinal, end_ordinal, is_private, all_day,
+#    [[weekday, start_minutes, end_minutes, location], ...]
+#    (, [[excluded start_ordinal, excluded end_ordinal], ...])]
+# Version 2 adds the exclusions, written only for courses that have some;
+# version 3 the global closures in the header.
+#   ...
+#   [offset of event 0, offset of event 1, ...]
+COMPACT_CONFIG_EXTENSION = '.jsonl'
+COMPACT_CONFIG_FORMAT = 'google-calendar-csv-generator/events'
+COMPACT_CONFIG_VERSION = 3
+_COMPACT_HEADER = '{{"format":"{}","version":{},"count":{:12d},"index_offset":{:16d},"exclusions":{}}}\n'
+
+def event_to_record(event: CourseEvent) -> list:
+    record = [event.subject, event.description, event.start_ordinal, event.end_ordinal,
+              int(event.is_private), int(event.all_day),
+              [[s.weekday, s.start_minutes, s.end_minutes, s.location] for s in event.sessions]]
+    if event.exclusions:
+        record.append([list(exclusion) for exclusion in event.exclusions])
+    return record
+
+def record_to_event(record: list) -> CourseEvent:
+    subject, description, start_ordinal, end_ordinal, is_private, all_day, sessions = record[:7]
+    return CourseEvent.from_ordinals(
+        subject, description, start_ordinal, end_ordinal,
+        [Session.from_minutes(*session) for session in sessions],
+        bool(is_private), bool(all_day),
+        [tuple(exclusion) for exclusion in record[7]] if len(record) > 7 else ()
+    )
+
+def save_compact_config(events: List[CourseEvent], filename: str,
+                        exclusions: Tuple[Tuple[int, int], ...] = ()):
+    """Salva la configurazione compatta (.jsonl) con l'indice degli offset"""
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    shared = encode([list(exclusion) for exclusion in exclusions])
+    header_size = len(_COMPACT_HEADER.format(COMPACT_CONFIG_FORMAT, COMPACT_CONFIG_VERSION, 0, 0, shared))
+    offsets = []
+    position = header_size
+    
+    if isinstance(events, LazyEventList):
+        # The events may be decoded lazily from this very file
+        events.release()
+    # Written aside and renamed, so a failed save leaves the old file intact
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'wb') as f:
+        f.write(b' ' * header_size)
+        batch = []
+        for event in events:
+            line = (encode(event_to_record(event)) + '\n').encode('utf-8')
+            offsets.append(position)
+            position += len(line)
+            batch.append(line)
+            if len(batch) == CSV_WRITE_BATCH_ROWS:
+                f.write(b''.join(batch))
+                batch.clear()
+        f.write(b''.join(batch))
+        f.write((encode(offsets) + '\n').encode('utf-8'))
+        
+        f.seek(0)
+        f.write(_COMPACT_HEADER.format(COMPACT_CONFIG_FORMAT, COMPACT_CONFIG_VERSION,
+                                       len(offsets), position, shared).encode('utf-8'))
+    os.replace(temp_filename, filename)
+
+def _read_compact_header(f) -> Tuple[int, int, Tuple[Tuple[int, int], ...]]:
+    try:
+        header = json.loads(f.readline())
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get('format') != COMPACT_CONFIG_FORMAT:
+        raise ValueError("Formato configurazione compatta non valido")
+    # Version 1 records are version 2 records without exclusions, and
+    # version 2 headers are version 3 headers without global closures
+    if header.get('version') not in (1, 2, COMPACT_CONFIG_VERSION):
+        raise ValueError(f"Versione configurazione non supportata: {header.get('version')}")
+    exclusions = normalize_exclusions(tuple(exclusion) for exclusion in header.get('exclusions', []))
+    return header['count'], header['index_offset'], exclusions
+
+class LazyEventList(MutableSequence):
+    """Eventi di una configurazione compatta, costruiti solo al primo accesso.
+    
+    Si comporta come una lista: len(), indici, slice, iterazione e modifiche.
+    Ogni record viene letto dal file mappato in memoria quando serve
+    (visualizzazione o export) e poi conservato. La mappa viene chiusa appena
+    non restano record da decodificare, o da release().
+    """
+    def __init__(self, data: mmap.mmap, offsets: List[int], end: int):
+        self._data = data
+        self._bounds = offsets + [end]
+        # Record number while still encoded, the CourseEvent once decoded
+        self._events: List[object] = list(range(len(offsets)))
+        self._encoded = len(offsets)
+        if not self._encoded:
+            self._close()
+    
+    def __len__(self):
+        return len(self._events)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._events)))]
+        event = self._events[index]
+        if isinstance(event, int):
+            record = json.loads(self._data[self._bounds[event]:self._bounds[event + 1]])
+            event = self._events[index] = record_to_event(record)
+            self._forget(1)
+        return event
+    
+    def __setitem__(self, index, event):
+        self._forget(self._count_encoded(index))
+        self._events[index] = event
+    
+    def __delitem__(self, index):
+        self._forget(self._count_encoded(index))
+        del self._events[index]
+    
+    def insert(self, index: int, event: CourseEvent):
+        self._events.insert(index, event)
+    
+    def clear(self):
+        # MutableSequence.clear pops, and so decodes, every event
+        self._events.clear()
+        self._forget(self._encoded)
+    
+    def decoded(self) -> Iterator[Tuple[int, CourseEvent]]:
+        """Posizione ed evento di quelli già decodificati"""
+        return ((index, event) for index, event in enumerate(self._events)
+                if not isinstance(event, int))
+    
+    def release(self):
+        """Decodifica i record rimasti e chiude la mappa, liberando il file (es. per sovrascriverlo)"""
+        for index, event in enumerate(self._events):
+            if isinstance(event, int):
+                self[index]
+        self._close()
+    
+    def _count_encoded(self, index) -> int:
+        items = self._events[index] if isinstance(index, slice) else [self._events[index]]
+        return sum(isinstance(event, int) for event in items)
+    
+    def _forget(self, count: int):
+        self._encoded -= count
+        if not self._encoded:
+            self._close()
+    
+    def _close(self):
+        # On Windows an open map keeps the file from being replaced
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+def load_compact_config(filename: str, progress: Optional[ProgressCallback] = None
+                        ) -> Tuple[LazyEventList, Tuple[Tuple[int, int], ...]]:
+    """Carica una configurazione compatta (e le chiusure globali) senza decodificare né leggere gli eventi"""
+    with open(filename, 'rb') as f:
+        count, index_offset, exclusions = _read_compact_header(f)
+        f.seek(index_offset)
+        offsets = json.loads(f.read())
+        # The map outlives the file object; pages are read as events are decoded
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    if len(offsets) != count:
+        raise ValueError("Indice della configurazione compatta non valido")
+    if progress is not None:
+        progress(count, count)
+    return LazyEventList(data, offsets, index_offset), exclusions
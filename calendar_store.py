@@ -0,0 +1,236 @@
+"""Archivio SQLite dei corsi: interroga solo il periodo su cui si lavora.
+
+Lo schema memorizza le date come ordinali e gli orari come minuti, come il
+modello in memoria, con indici su subject, description e intervallo di date.
+"""
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from calendar_engine import CourseEvent, EventIndex, Session
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    subject TEXT NOT NULL,
+    description TEXT NOT NULL,
+    start_ordinal INTEGER NOT NULL,
+    end_ordinal INTEGER NOT NULL,
+    is_private INTEGER NOT NULL,
+    all_day INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    weekday INTEGER NOT NULL,
+    start_minutes INTEGER NOT NULL,
+    end_minutes INTEGER NOT NULL,
+    location TEXT NOT NULL,
+    PRIMARY KEY (event_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS exclusions (
+    event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+    start_ordinal INTEGER NOT NULL,
+    end_ordinal INTEGER NOT NULL,
+    PRIMARY KEY (event_id, start_ordinal)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS closures (
+    start_ordinal INTEGER PRIMARY KEY,
+    end_ordinal INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_subject ON events(subject);
+CREATE INDEX IF NOT EXISTS events_description ON events(description);
+CREATE INDEX IF NOT EXISTS events_dates ON events(start_ordinal, end_ordinal);
+"""
+
+STORE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+def is_store_file(filename: str) -> bool:
+    return filename.lower().endswith(STORE_EXTENSIONS)
+
+class EventStore:
+    """Archivio di CourseEvent su SQLite con salvataggi incrementali.
+
+    query() restituisce gli eventi di un periodo e ne ricorda l'id di riga;
+    save() scrive in una sola transazione solo gli eventi nuovi, modificati o
+    rimossi rispetto all'ultima query, senza toccare il resto dell'archivio.
+    """
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+        # Row id -> (event as loaded or last saved, its content key)
+        self._loaded: Dict[int, Tuple[CourseEvent, tuple]] = {}
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def count(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def exclusions(self) -> Tuple[Tuple[int, int], ...]:
+        """Chiusure globali dell'archivio, valide per tutti i corsi"""
+        return tuple(self.connection.execute(
+            "SELECT start_ordinal, end_ordinal FROM closures ORDER BY start_ordinal").fetchall())
+
+    def query(self, start_ordinal: Optional[int] = None, end_ordinal: Optional[int] = None,
+              subject: Optional[str] = None, description: Optional[str] = None) -> List[CourseEvent]:
+        """Eventi che si sovrappongono a [start_ordinal, end_ordinal], con filtri facoltativi"""
+        conditions = []
+        params = []
+        if end_ordinal is not None:
+            conditions.append("e.start_ordinal <= ?")
+            params.append(end_ordinal)
+        if start_ordinal is not None:
+            conditions.append("e.end_ordinal >= ?")
+            params.append(start_ordinal)
+        if subject is not None:
+            conditions.append("e.subject = ?")
+            params.append(subject)
+        if description is not None:
+            conditions.append("e.description = ?")
+            params.append(description)
+        events = self._select(conditions, params)
+
+        # The result becomes the working set that save() reconciles against
+        self._loaded = {row_id: (event, event.content_key()) for row_id, event in events}
+        return [event for _, event in events]
+
+    def _select(self, conditions: List[str], params: list) -> List[Tuple[int, CourseEvent]]:
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        rows = self.connection.execute(
+            "SELECT e.id, e.subject, e.description, e.start_ordinal, e.end_ordinal, "
+            "e.is_private, e.all_day, s.weekday, s.start_minutes, s.end_minutes, s.location "
+            f"FROM events e LEFT JOIN sessions s ON s.event_id = e.id {where} "
+            "ORDER BY e.id, s.position", params
+        )
+
+        excluded: Dict[int, List[Tuple[int, int]]] = {}
+        for row_id, start, end in self.connection.execute(
+                "SELECT x.event_id, x.start_ordinal, x.end_ordinal FROM exclusions x "
+                f"JOIN events e ON e.id = x.event_id {where}", params):
+            excluded.setdefault(row_id, []).append((start, end))
+
+        events = []
+        current_id = None
+        for (row_id, subject, description, start, end, is_private, all_day,
+             weekday, start_minutes, end_minutes, location) in rows:
+            if row_id != current_id:
+                current_id = row_id
+                event = CourseEvent.from_ordinals(subject, description, start, end, [],
+                                                  bool(is_private), bool(all_day),
+                                                  excluded.get(row_id, ()))
+                events.append((row_id, event))
+            if weekday is not None:
+                event.sessions.append(Session.from_minutes(weekday, start_minutes,
+                                                           end_minutes, location))
+        return events
+
+    def add_events(self, events: Iterable[CourseEvent]) -> Dict[str, int]:
+        """Aggiunge eventi in una sola transazione (es. un import massivo), unendoli come merge_events.
+
+        Ogni evento viene confrontato con i corsi archiviati con lo stesso
+        subject e description: un import ripetuto non duplica l'archivio.
+        Restituisce i conteggi per tipo ('added', 'merged', 'duplicate').
+        """
+        counts = {'added': 0, 'merged': 0, 'duplicate': 0}
+        # (subject, description) -> (stored rows as (row id, event), index merging into them)
+        groups: Dict[Tuple[str, str], Tuple[List[Tuple[int, CourseEvent]], EventIndex]] = {}
+        for event in events:
+            key = (event.subject, event.description)
+            group = groups.get(key)
+            if group is None:
+                stored = self._select(["e.subject = ?", "e.description = ?"], list(key))
+                group = groups[key] = stored, EventIndex([stored_event for _, stored_event in stored])
+            counts[group[1].add(event)] += 1
+
+        with self.connection:
+            for stored, index in groups.values():
+                # EventIndex replaces merged events with new objects and appends added ones
+                for (row_id, stored_event), event in zip(stored, index.events):
+                    if event is not stored_event:
+                        self._update(row_id, event)
+                for event in index.events[len(stored):]:
+                    self._insert(event)
+        return counts
+
+    def save(self, events: List[CourseEvent],
+             exclusions: Optional[Tuple[Tuple[int, int], ...]] = None) -> Dict[str, int]:
+        """Salva incrementalmente gli eventi dell'ultima query(), in una transazione.
+
+        Gli eventi nuovi vengono inseriti, quelli modificati aggiornati e quelli
+        caricati ma non più presenti eliminati. Con exclusions sostituisce anche
+        le chiusure globali. Restituisce i conteggi per tipo.
+        """
+        row_ids = {id(event): row_id for row_id, (event, _) in self._loaded.items()}
+        previous = list(self._loaded)
+        counts = {'inserted': 0, 'updated': 0, 'deleted': 0}
+        kept = set()
+
+        with self.connection:
+            for event in events:
+                row_id = row_ids.get(id(event))
+                if row_id is None:
+                    row_id = self._insert(event)
+                    counts['inserted'] += 1
+                elif event.content_key() != self._loaded[row_id][1]:
+                    self._update(row_id, event)
+                    counts['updated'] += 1
+                self._loaded[row_id] = (event, event.content_key())
+                kept.add(row_id)
+
+            # Only rows loaded into this session can be removed; the rest of the store is untouched
+            removed = [row_id for row_id in previous if row_id not in kept]
+            self.connection.executemany("DELETE FROM events WHERE id = ?",
+                                        [(row_id,) for row_id in removed])
+            for row_id in removed:
+                del self._loaded[row_id]
+            counts['deleted'] = len(removed)
+
+            if exclusions is not None:
+                self.connection.execute("DELETE FROM closures")
+                self.connection.executemany("INSERT INTO closures (start_ordinal, end_ordinal) VALUES (?, ?)",
+                                            exclusions)
+
+        return counts
+
+    def _insert(self, event: CourseEvent) -> int:
+        cursor = self.connection.execute(
+            "INSERT INTO events (subject, description, start_ordinal, end_ordinal, is_private, all_day) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (event.subject, event.description, event.start_ordinal, event.end_ordinal,
+             int(event.is_private), int(event.all_day))
+        )
+        self._insert_sessions(cursor.lastrowid, event)
+        return cursor.lastrowid
+
+    def _update(self, row_id: int, event: CourseEvent):
+        self.connection.execute(
+            "UPDATE events SET subject = ?, description = ?, start_ordinal = ?, end_ordinal = ?, "
+            "is_private = ?, all_day = ? WHERE id = ?",
+            (event.subject, event.description, event.start_ordinal, event.end_ordinal,
+             int(event.is_private), int(event.all_day), row_id)
+        )
+        self.connection.execute("DELETE FROM sessions WHERE event_id = ?", (row_id,))
+        self.connection.execute("DELETE FROM exclusions WHERE event_id = ?", (row_id,))
+        self._insert_sessions(row_id, event)
+
+    def _insert_sessions(self, row_id: int, event: CourseEvent):
+        self.connection.executemany(
+            "INSERT INTO sessions (event_id, position, weekday, start_minutes, end_minutes, location) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(row_id, position, session.weekday, session.start_minutes, session.end_minutes,
+              session.location) for position, session in enumerate(event.sessions)]
+        )
+        self.connection.executemany(
+            "INSERT INTO exclusions (event_id, start_ordinal, end_ordinal) VALUES (?, ?, ?)",
+            [(row_id, start, end) for start, end in event.exclusions]
+        )
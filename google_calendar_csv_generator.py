@@ -1,230 +1,26 @@
-import csv
-import json
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog, scrolledtext
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from tkinter import ttk, messagebox, filedialog, scrolledtext, simpledialog
+from datetime import datetime
+from typing import Callable, Iterable, List, Dict, Optional, Tuple
 import os
-from dataclasses import dataclass
-from enum import Enum
-from collections import defaultdict
+import queue
+import threading
+from functools import partial
+from itertools import islice
 
-class DateFormat(Enum):
-    ITALIAN = "DD/MM/YYYY"
-    ISO = "YYYY-MM-DD"
+from calendar_engine import (
+    CSV_HEADERS, DateFormat, WEEKDAYS_IT, Session, CourseEvent,
+    parse_date_flexible, parse_time, load_csv_events_parallel, load_csv_files,
+    iter_csv_rows, generate_csv_rows, write_csv, count_total_occurrences,
+    save_config_file, load_config_file, merge_events, write_ics, load_ics_events,
+    find_conflicts, format_conflict, apply_exclusions, parse_exclusions, format_exclusions,
+    LazyEventList, OperationCancelled,
+)
+from calendar_store import EventStore
 
-WEEKDAYS_IT = ["Lunedì", "Martedì", "Mercoledì", "Giovedì", "Venerdì", "Sabato", "Domenica"]
-
-@dataclass
-class Session:
-    weekday: int  # 0=Lunedì, 6=Domenica
-    start_time: str  # HH:MM
-    end_time: str  # HH:MM
-    location: str
-    
-    def __str__(self):
-        return f"{WEEKDAYS_IT[self.weekday]} {self.start_time}-{self.end_time} @ {self.location}"
-
-@dataclass
-class CourseEvent:
-    subject: str
-    description: str
-    start_date: str
-    end_date: str
-    sessions: List[Session]
-    is_private: bool = True
-    all_day: bool = False
-    
-    def get_total_occurrences(self) -> int:
-        if not self.sessions:
-            return 0
-        try:
-            start = self.parse_date(self.start_date)
-            end = self.parse_date(self.end_date)
-            weeks = ((end - start).days // 7) + 1
-            return len(self.sessions) * weeks
-        except:
-            return 0
-
-    @staticmethod
-    def parse_date(date_str: str) -> datetime:
-        for fmt in ["%d/%m/%Y", "%Y-%m-%d"]:
-            try:
-                return datetime.strptime(date_str, fmt)
-            except:
-                continue
-        raise ValueError(f"Formato data non valido: {date_str}")
-
-def parse_date_flexible(date_str: str) -> Optional[datetime]:
-    date_str = date_str.strip()
-    for fmt in ["%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%Y/%m/%d", "%m/%d/%Y"]:
-        try:
-            return datetime.strptime(date_str, fmt)
-        except:
-            continue
-    return None
-
-def parse_time(time_str: str) -> Optional[datetime]:
-    try:
-        return datetime.strptime(time_str.strip(), "%H:%M")
-    except:
-        return None
-
-def parse_time_12h(time_str: str) -> str:
-    try:
-        if not time_str or time_str.strip() == "":
-            return "09:00"
-        time_str = time_str.strip()
-        time_obj = datetime.strptime(time_str, "%I:%M %p")
-        return time_obj.strftime("%H:%M")
-    except:
-        try:
-            if time_str.startswith("0"):
-                time_str = time_str[1:]
-            time_obj = datetime.strptime(time_str, "%I:%M %p")
-            return time_obj.strftime("%H:%M")
-        except:
-            return "09:00"
-
-def format_date_for_google(date: datetime) -> str:
-    return date.strftime("%m/%d/%Y")
-
-def format_time_12h(time_str: str) -> str:
-    try:
-        time_obj = datetime.strptime(time_str, "%H:%M")
-        return time_obj.strftime("%I:%M %p").lstrip("0")
-    except:
-        return "09:00 AM"
-
-def get_dates_for_weekday(start_date: datetime, end_date: datetime, weekday: int) -> List[datetime]:
-    current = start_date
-    days_ahead = (weekday - current.weekday()) % 7
-    current = current + timedelta(days=days_ahead)
-    dates = []
-    while current <= end_date:
-        dates.append(current)
-        current += timedelta(weeks=1)
-    return dates
-
-def load_csv_events(filename: str) -> List[CourseEvent]:
-    """Carica eventi da un file CSV e li converte in CourseEvent"""
-    events = []
-    
-    try:
-        with open(filename, 'r', encoding='utf-8') as csvfile:
-            try:
-                content = csvfile.read()
-            except UnicodeDecodeError:
-                csvfile.close()
-                with open(filename, 'r', encoding='latin1') as csvfile2:
-                    content = csvfile2.read()
-            
-            lines = content.splitlines()
-            reader = csv.DictReader(lines)
-            
-            # Group events by subject and description
-            event_groups = defaultdict(list)
-            
-            for row in reader:
-                subject = row.get('Subject', '').strip()
-                description = row.get('Description', '').strip()
-                
-                if not subject:
-                    continue
-                
-                key = f"{subject}|{description}"
-                event_groups[key].append(row)
-            
-            # Convert groups back to CourseEvent objects
-            for key, rows in event_groups.items():
-                subject, description = key.split('|', 1)
-                events.append(csv_rows_to_course_event(subject, description, rows))
-        
-        return events
-        
-    except Exception as e:
-        raise Exception(f"Errore nel caricamento del CSV: {str(e)}")
-
-def csv_rows_to_course_event(subject: str, description: str, rows: List[Dict]) -> CourseEvent:
-    """Converte le righe CSV in un oggetto CourseEvent - VERSIONE CORRETTA E DEBUGGATA"""
-    
-    first_row = rows[0]
-    all_day = first_row.get('All Day Event', 'False').strip().lower() == 'true'
-    is_private = first_row.get('Private', 'True').strip().lower() == 'true'
-    
-    # STEP 1: Parse all dates correctly (CSV uses MM/DD/YYYY format)
-    all_dates = []
-    for row in rows:
-        start_date_str = row.get('Start Date', '').strip()
-        if start_date_str:
-            # Force MM/DD/YYYY parsing for Google Calendar CSVs
-            try:
-                date_obj = datetime.strptime(start_date_str, "%m/%d/%Y")
-                all_dates.append(date_obj)
-            except:
-                # Fallback to flexible parsing
-                date_obj = parse_date_flexible(start_date_str)
-                if date_obj:
-                    all_dates.append(date_obj)
-    
-    if not all_dates:
-        start_date = datetime.now().strftime("%d/%m/%Y")
-        end_date = (datetime.now() + timedelta(days=90)).strftime("%d/%m/%Y")
-    else:
-        # Convert to DD/MM/YYYY format for display
-        start_date = min(all_dates).strftime("%d/%m/%Y")
-        end_date = max(all_dates).strftime("%d/%m/%Y")
-    
-    sessions = []
-    
-    if not all_day:
-        # STEP 2: Extract unique session patterns
-        unique_sessions = set()
-        
-        for row in rows:
-            start_date_str = row.get('Start Date', '').strip()
-            start_time_str = row.get('Start Time', '').strip()
-            end_time_str = row.get('End Time', '').strip()
-            location = row.get('Location', '').strip()
-            
-            if start_date_str and start_time_str and end_time_str:
-                # Parse date with MM/DD/YYYY format
-                try:
-                    date_obj = datetime.strptime(start_date_str, "%m/%d/%Y")
-                except:
-                    date_obj = parse_date_flexible(start_date_str)
-                
-                if date_obj:
-                    weekday = date_obj.weekday()  # 0=Monday, 6=Sunday
-                    start_time_24h = parse_time_12h(start_time_str)
-                    end_time_24h = parse_time_12h(end_time_str)
-                    
-                    # Normalize location (remove extra spaces)
-                    location = ' '.join(location.split())
-                    
-                    # Create unique session key
-                    session_key = (weekday, start_time_24h, end_time_24h, location)
-                    unique_sessions.add(session_key)
-        
-        # STEP 3: Convert unique sessions to Session objects
-        for weekday, start_time, end_time, location in sorted(unique_sessions):
-            session = Session(
-                weekday=weekday,
-                start_time=start_time,
-                end_time=end_time,
-                location=location
-            )
-            sessions.append(session)
-    
-    return CourseEvent(
-        subject=subject,
-        description=description,
-        start_date=start_date,
-        end_date=end_date,
-        sessions=sessions,
-        is_private=is_private,
-        all_day=all_day
-    )
+TREE_CHUNK_ROWS = 500
+CONFLICTS_SHOWN = 25
+TASK_POLL_MS = 100
 
 class SessionDialog(tk.Toplevel):
     """Dialog per aggiungere/modificare una sessione"""
@@ -304,15 +100,127 @@ class SessionDialog(tk.Toplevel):
     def cancel_clicked(self):
         self.destroy()
 
+class CsvPreviewWindow(tk.Toplevel):
+    """Anteprima CSV paginata: le righe vengono generate solo quando si scorre"""
+    PAGE_ROWS = 50
+    
+    def __init__(self, parent, events: List[CourseEvent]):
+        super().__init__(parent)
+        self.title("Anteprima CSV")
+        self.geometry("800x500")
+        
+        # Total from occurrence arithmetic, rows from a lazy ordered stream
+        self.total = count_total_occurrences(events)
+        self.rows = iter_csv_rows(list(events))
+        self.shown = 0
+        self.loading = False
+        
+        self.text_widget = scrolledtext.ScrolledText(self, wrap=tk.NONE)
+        self.text_widget.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.text_widget.config(yscrollcommand=self.on_scroll)
+        
+        self.text_widget.insert(tk.END, ','.join(CSV_HEADERS) + '\n')
+        self.text_widget.insert(tk.END, '-' * 100 + '\n')
+        
+        bottom_frame = ttk.Frame(self)
+        bottom_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        
+        self.count_var = tk.StringVar()
+        ttk.Label(bottom_frame, textvariable=self.count_var).pack(side=tk.LEFT)
+        ttk.Button(bottom_frame, text="Chiudi", command=self.destroy).pack(side=tk.RIGHT)
+        
+        self.load_page()
+    
+    def load_page(self):
+        self.loading = False
+        page = list(islice(self.rows, self.PAGE_ROWS))
+        
+        if page:
+            lines = []
+            for i, row in enumerate(page, start=self.shown + 1):
+                line = ','.join([str(row.get(h, '')) for h in CSV_HEADERS])
+                lines.append(f"{i}. {line}\n")
+            
+            self.text_widget.config(state=tk.NORMAL)
+            self.text_widget.insert(tk.END, ''.join(lines))
+            self.shown += len(page)
+        self.text_widget.config(state=tk.DISABLED)
+        if len(page) < self.PAGE_ROWS:
+            # The stream is exhausted: the rows shown are all the rows
+            self.total = self.shown
+        
+        if self.shown < self.total:
+            self.count_var.set(f"Mostrati {self.shown} di {self.total} eventi - scorri per caricarne altri")
+        else:
+            self.count_var.set(f"TOTALE: {self.total} eventi")
+    
+    def on_scroll(self, first, last):
+        self.text_widget.vbar.set(first, last)
+        # Pull the next page once the view reaches the bottom
+        if float(last) >= 0.98 and self.shown < self.total and not self.loading:
+            self.loading = True
+            self.after_idle(self.load_page)
+
+class BackgroundTask:
+    """Operazione lunga eseguita in un thread di lavoro.
+    
+    Il thread non tocca mai tkinter: avanzamento e risultato passano da una coda
+    letta dal mainloop, e l'annullamento viene controllato a ogni callback di
+    avanzamento del motore.
+    """
+    def __init__(self, func: Callable, *args):
+        self.func = func
+        self.args = args
+        self.queue: queue.Queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+    
+    def start(self):
+        self.thread.start()
+    
+    def cancel(self):
+        self.cancel_event.set()
+    
+    def progress(self, done: int, total: int):
+        if self.cancel_event.is_set():
+            raise OperationCancelled()
+        self.queue.put(('progress', (done, total)))
+    
+    def run(self):
+        try:
+            result = self.func(*self.args, progress=self.progress)
+        except OperationCancelled:
+            self.queue.put(('cancelled', None))
+        except Exception as e:
+            self.queue.put(('error', e))
+        else:
+            self.queue.put(('done', result))
+
+def decoded_events(events: List[CourseEvent]) -> Iterable[Tuple[int, CourseEvent]]:
+    """Posizione ed evento di quelli già costruiti, senza decodificare una LazyEventList"""
+    if isinstance(events, LazyEventList):
+        return events.decoded()
+    return enumerate(events)
+
 class GoogleCalendarGenerator:
     def __init__(self, root):
         self.root = root
         self.root.title("📅 Google Calendar CSV Generator & Editor")
         self.root.geometry("1200x700")
         self.events: List[CourseEvent] = []
+        # Closures for every course, kept apart and applied only when expanding
+        self.exclusions: Tuple[Tuple[int, int], ...] = ()
         self.current_sessions: List[Session] = []
         self.date_format = DateFormat.ITALIAN
         self.loaded_csv_filename = None
+        # SQLite catalog; self.events then holds only the term being edited
+        self.store: Optional[EventStore] = None
+        # Treeview iid -> event currently shown, for incremental refreshes
+        self.tree_events: Dict[str, CourseEvent] = {}
+        self.tree_job = None
+        # Run once the last chunk of rows is in the Treeview
+        self.tree_callbacks: List[Callable] = []
+        self.task: Optional[BackgroundTask] = None
         
         self.create_menu()
         self.create_widgets()
@@ -327,14 +235,25 @@ class GoogleCalendarGenerator:
         file_menu.add_command(label="📂 Carica configurazione", command=self.load_config)
         file_menu.add_command(label="💾 Salva configurazione", command=self.save_config)
         file_menu.add_separator()
+        file_menu.add_command(label="🗄️ Apri archivio (periodo corrente)", command=self.open_store)
+        file_menu.add_command(label="🗄️ Salva nell'archivio", command=self.save_store)
+        file_menu.add_separator()
         file_menu.add_command(label="📋 Carica CSV esistente", command=self.load_csv)
+        file_menu.add_command(label="📚 Carica più CSV", command=self.load_csv_bulk)
         file_menu.add_command(label="📊 Genera CSV", command=self.generate_csv)
+        file_menu.add_command(label="📆 Genera CSV (solo periodo corrente)", command=self.generate_csv_period)
+        file_menu.add_command(label="📅 Genera ICS", command=self.generate_ics)
         file_menu.add_separator()
         file_menu.add_command(label="❌ Esci", command=self.root.quit)
         
         edit_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Modifica", menu=edit_menu)
         edit_menu.add_command(label="➕ Aggiungi corso", command=self.add_course)
+        edit_menu.add_command(label="⚠️ Conflitti di orario", command=self.show_conflicts)
+        edit_menu.add_command(label="🚪 Conflitti di aula",
+                              command=lambda: self.show_conflicts(same_location=True))
+        edit_menu.add_command(label="🏖️ Chiusure per tutti i corsi", command=self.edit_global_exclusions)
+        edit_menu.add_separator()
         edit_menu.add_command(label="🔄 Reset tutto", command=self.reset_all)
     
     def create_widgets(self):
@@ -368,8 +287,12 @@ class GoogleCalendarGenerator:
         self.end_date_var = tk.StringVar(value="22/12/2025")
         ttk.Entry(details_frame, textvariable=self.end_date_var, width=15).grid(row=3, column=1, pady=3)
         
+        ttk.Label(details_frame, text="Date escluse:").grid(row=4, column=0, sticky="w", pady=3)
+        self.exclusions_var = tk.StringVar()
+        ttk.Entry(details_frame, textvariable=self.exclusions_var, width=40).grid(row=4, column=1, pady=3)
+        
         options_frame = ttk.Frame(details_frame)
-        options_frame.grid(row=4, column=0, columnspan=2, pady=10)
+        options_frame.grid(row=5, column=0, columnspan=2, pady=10)
         
         self.private_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(options_frame, text="Privato", variable=self.private_var).pack(side=tk.LEFT, padx=5)
@@ -455,6 +378,14 @@ class GoogleCalendarGenerator:
                                          command=self.generate_csv)
         self.generate_button.pack(fill=tk.X, padx=10, pady=10)
         
+        # Background task progress (packed only while a task runs)
+        self.progress_frame = ttk.Frame(self.root)
+        self.progress_var = tk.DoubleVar(value=0)
+        ttk.Progressbar(self.progress_frame, variable=self.progress_var,
+                        maximum=100).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        ttk.Button(self.progress_frame, text="⏹️ Annulla",
+                   command=self.cancel_task).pack(side=tk.RIGHT, padx=5)
+        
         # Status bar
         self.status_var = tk.StringVar(value="Pronto")
         self.status_bar = ttk.Label(self.root, textvariable=self.status_var, 
@@ -499,6 +430,9 @@ class GoogleCalendarGenerator:
     
     # Event management
     def add_course(self):
+        if self.task_running():
+            return
+        
         subject = self.subject_var.get().strip()
         if not subject:
             messagebox.showerror("Errore", "Inserisci il nome del corso")
@@ -515,6 +449,12 @@ class GoogleCalendarGenerator:
             messagebox.showerror("Errore", "Data fine deve essere dopo data inizio")
             return
         
+        try:
+            exclusions = parse_exclusions(self.exclusions_var.get())
+        except ValueError as e:
+            messagebox.showerror("Errore", str(e))
+            return
+        
         event = CourseEvent(
             subject=subject,
             description=self.description_var.get().strip(),
@@ -522,7 +462,8 @@ class GoogleCalendarGenerator:
             end_date=end_date,
             sessions=self.current_sessions.copy(),
             is_private=self.private_var.get(),
-            all_day=self.all_day_var.get()
+            all_day=self.all_day_var.get(),
+            exclusions=exclusions
         )
         
         self.events.append(event)
@@ -532,19 +473,22 @@ class GoogleCalendarGenerator:
         self.update_status(f"Corso '{subject}' aggiunto")
     
     def edit_event(self):
+        if self.task_running():
+            return
+        
         selection = self.events_tree.selection()
         if not selection:
             messagebox.showwarning("Attenzione", "Seleziona un evento")
             return
 
-        idx = int(selection[0])
-        event = self.events[idx]
+        event = self.tree_events[selection[0]]
 
         # Load into form
         self.subject_var.set(event.subject)
         self.description_var.set(event.description)
         self.start_date_var.set(event.start_date)
         self.end_date_var.set(event.end_date)
+        self.exclusions_var.set(format_exclusions(event.exclusions))
         self.private_var.set(event.is_private)
         self.all_day_var.set(event.all_day)
 
@@ -555,22 +499,24 @@ class GoogleCalendarGenerator:
             self.sessions_listbox.insert(tk.END, str(s))
 
         # Remove event (will be recreated when saved)
-        del self.events[idx]
+        del self.events[self.event_index(event)]
         self.refresh_events_tree()
         self.update_statistics()
         self.update_status(f"Modifica '{event.subject}' - aggiorna e premi 'Aggiungi Corso'")
 
     def remove_event(self):
+        if self.task_running():
+            return
+        
         selection = self.events_tree.selection()
         if not selection:
             messagebox.showwarning("Attenzione", "Seleziona un evento")
             return
         
-        idx = int(selection[0])
-        event = self.events[idx]
+        event = self.tree_events[selection[0]]
         
         if messagebox.askyesno("Conferma", f"Rimuovere '{event.subject}'?"):
-            del self.events[idx]
+            del self.events[self.event_index(event)]
             self.refresh_events_tree()
             self.update_statistics()
             self.update_status(f"Evento rimosso")
@@ -581,89 +527,230 @@ class GoogleCalendarGenerator:
             messagebox.showwarning("Attenzione", "Seleziona un evento")
             return
         
-        idx = int(selection[0])
-        event = self.events[idx]
+        event = self.tree_events[selection[0]]
         
         details = f"📚 {event.subject}\n"
         details += f"👤 {event.description}\n" if event.description else ""
         details += f"📅 {event.start_date} → {event.end_date}\n"
         details += f"🔒 Privato: {'Sì' if event.is_private else 'No'}\n"
-        details += f"🌅 Tutto il giorno: {'Sì' if event.all_day else 'No'}\n\n"
+        details += f"🌅 Tutto il giorno: {'Sì' if event.all_day else 'No'}\n"
+        details += f"🏖️ Date escluse: {format_exclusions(event.exclusions)}\n" if event.exclusions else ""
+        details += "\n"
         details += "📍 Sessioni:\n"
         
         for session in event.sessions:
             details += f"  • {session}\n"
         
-        details += f"\n📊 Totale eventi: {event.get_total_occurrences()}"
+        details += f"\n📊 Totale eventi: {self.course_occurrences(event)}"
         
         messagebox.showinfo("Dettagli", details)
     
+    def edit_global_exclusions(self):
+        if self.task_running():
+            return
+        
+        text = simpledialog.askstring(
+            "Chiusure per tutti i corsi",
+            "Date o intervalli esclusi (es. 08/12/2025, 24/12/2025-06/01/2026):",
+            initialvalue=format_exclusions(self.exclusions), parent=self.root)
+        if text is None:
+            return
+        try:
+            exclusions = parse_exclusions(text)
+        except ValueError as e:
+            messagebox.showerror("Errore", str(e))
+            return
+        
+        # The courses keep only their own exclusions; these apply on expansion
+        self.exclusions = exclusions
+        
+        for iid, event in self.tree_events.items():
+            self.events_tree.item(iid, values=self.tree_values(event))
+        self.update_statistics()
+        self.update_status(f"Chiusure aggiornate: {len(exclusions)} periodi")
+    
+    def expanded_events(self) -> List[CourseEvent]:
+        """Copia degli eventi con le chiusure globali, per export, conteggi e conflitti"""
+        return apply_exclusions(list(self.events), self.exclusions)
+    
+    def course_occurrences(self, event: CourseEvent) -> int:
+        return apply_exclusions([event], self.exclusions)[0].get_total_occurrences()
+    
+    def show_conflicts(self, same_location: bool = False):
+        conflicts = find_conflicts(self.expanded_events(), same_location)
+        kind = "di aula" if same_location else "di orario"
+        if not conflicts:
+            messagebox.showinfo("Conflitti", f"Nessun conflitto {kind}")
+            return
+        
+        details = f"{len(conflicts)} conflitti {kind}:\n\n"
+        details += "\n".join(format_conflict(conflict) for conflict in conflicts[:CONFLICTS_SHOWN])
+        if len(conflicts) > CONFLICTS_SHOWN:
+            details += f"\n\n... e altri {len(conflicts) - CONFLICTS_SHOWN}"
+        
+        messagebox.showwarning("Conflitti", details)
+        self.update_status(f"{len(conflicts)} conflitti {kind}")
+    
+    def event_index(self, event: CourseEvent) -> int:
+        # Identity, not equality: two courses may have identical content.
+        # A shown event is already decoded, so the others need not be.
+        for idx, e in decoded_events(self.events):
+            if e is event:
+                return idx
+        raise ValueError("Evento non trovato")
+    
     def refresh_events_tree(self):
-        for item in self.events_tree.get_children():
-            self.events_tree.delete(item)
-        
-        for idx, event in enumerate(self.events):
-            periodo = f"{event.start_date[:10]} → {event.end_date[:10]}"
-            self.events_tree.insert('', tk.END, 
-                                   iid=str(idx),
-                                   values=(event.subject,
-                                          event.description,
-                                          periodo,
-                                          len(event.sessions),
-                                          event.get_total_occurrences()))
+        """Allinea la Treeview a self.events toccando solo gli iid cambiati"""
+        if self.tree_job is not None:
+            self.root.after_cancel(self.tree_job)
+            self.tree_job = None
+        
+        # id() is stable here: tree_events keeps shown events alive until deleted.
+        # Only decoded events can be shown; the rest are decoded chunk by chunk.
+        current = {str(id(event)): event for _, event in decoded_events(self.events)}
+        
+        stale = [iid for iid, event in self.tree_events.items() if current.get(iid) is not event]
+        if stale:
+            self.events_tree.delete(*stale)
+            for iid in stale:
+                del self.tree_events[iid]
+        
+        # Rows go back at their list position, so events replaced by a merge keep their place
+        shown = {position for position, event in decoded_events(self.events)
+                 if str(id(event)) in self.tree_events}
+        pending = [position for position in range(len(self.events)) if position not in shown]
+        self.insert_tree_rows(pending)
+    
+    def tree_values(self, event: CourseEvent) -> tuple:
+        periodo = f"{event.start_date[:10]} → {event.end_date[:10]}"
+        return (event.subject, event.description, periodo, len(event.sessions),
+                self.course_occurrences(event))
+    
+    def insert_tree_rows(self, pending: List[int]):
+        """Inserisce le righe a blocchi, lasciando respirare il mainloop tra un blocco e l'altro"""
+        self.tree_job = None
+        chunk, rest = pending[:TREE_CHUNK_ROWS], pending[TREE_CHUNK_ROWS:]
+        
+        for position in chunk:
+            # Decodes a lazily loaded event only now that its row is due
+            event = self.events[position]
+            iid = str(id(event))
+            self.events_tree.insert('', position, iid=iid, values=self.tree_values(event))
+            self.tree_events[iid] = event
+        
+        if rest:
+            self.tree_job = self.root.after(1, self.insert_tree_rows, rest)
+        else:
+            callbacks, self.tree_callbacks = self.tree_callbacks, []
+            for callback in callbacks:
+                callback()
+    
+    def when_tree_ready(self, callback: Callable):
+        """Esegue callback subito, o dopo l'ultimo blocco di righe se l'inserimento è in corso"""
+        if self.tree_job is None:
+            callback()
+        elif callback not in self.tree_callbacks:
+            self.tree_callbacks.append(callback)
     
     def update_statistics(self):
         if not self.events:
             self.stats_label.config(text="Nessun evento")
             return
+        if self.tree_job is not None:
+            # Counting decodes every course: wait for the rows, which decode them anyway
+            self.stats_label.config(text=f"Corsi: {len(self.events)} | Caricamento...")
+            self.when_tree_ready(self.update_statistics)
+            return
         
         total_events = len(self.events)
         total_sessions = sum(len(e.sessions) for e in self.events)
-        total_occurrences = sum(e.get_total_occurrences() for e in self.events)
+        total_occurrences = count_total_occurrences(self.expanded_events())
         
         stats_text = f"Corsi: {total_events} | Sessioni: {total_sessions} | Eventi CSV: {total_occurrences}"
         self.stats_label.config(text=stats_text)
     
     # CSV operations
     def load_csv(self):
+        if self.task_running():
+            return
+        
         filename = filedialog.askopenfilename(
             title="Carica CSV",
-            filetypes=[('CSV files', '*.csv'), ('All files', '*.*')]
+            filetypes=[('CSV files', '*.csv'), ('iCalendar files', '*.ics'), ('All files', '*.*')]
         )
         
         if not filename:
             return
         
-        try:
-            if self.events:
-                choice = messagebox.askyesnocancel(
-                    "Eventi esistenti",
-                    "Sostituire (Sì) o unire (No) agli eventi correnti?"
-                )
-                if choice is None:
-                    return
-                elif choice:
-                    self.events.clear()
-            
-            csv_events = load_csv_events(filename)
-            
-            if not csv_events:
-                messagebox.showwarning("Attenzione", "Nessun evento nel CSV")
+        replace = False
+        if self.events:
+            choice = messagebox.askyesnocancel(
+                "Eventi esistenti",
+                "Sostituire (Sì) o unire (No) agli eventi correnti?"
+            )
+            if choice is None:
                 return
-            
-            self.events.extend(csv_events)
-            self.loaded_csv_filename = filename
-            
-            self.refresh_events_tree()
-            self.update_statistics()
-            self.update_csv_indicator()
-            
-            messagebox.showinfo("Successo", 
-                               f"CSV caricato: {len(csv_events)} eventi")
-            self.update_status(f"CSV caricato: {len(csv_events)} eventi")
-            
-        except Exception as e:
-            messagebox.showerror("Errore", f"Errore CSV: {str(e)}")
+            replace = choice
+        
+        loader = load_ics_events if filename.lower().endswith('.ics') else load_csv_events_parallel
+        self.run_in_background("Caricamento CSV", loader, (filename,),
+                               lambda csv_events: self.apply_csv_events(filename, csv_events, replace),
+                               error_prefix="Errore CSV")
+    
+    def load_csv_bulk(self):
+        if self.task_running():
+            return
+        
+        filenames = filedialog.askopenfilenames(
+            title="Carica più CSV",
+            filetypes=[('CSV files', '*.csv'), ('iCalendar files', '*.ics'), ('All files', '*.*')]
+        )
+        
+        if not filenames:
+            return
+        filenames = list(filenames)
+        
+        replace = False
+        if self.events:
+            choice = messagebox.askyesnocancel(
+                "Eventi esistenti",
+                "Sostituire (Sì) o unire (No) agli eventi correnti?"
+            )
+            if choice is None:
+                return
+            replace = choice
+        
+        self.run_in_background("Caricamento CSV multiplo", load_csv_files, (filenames,),
+                               lambda result: self.apply_csv_events(filenames[0], result[0], replace,
+                                                                    self.format_timings(result[1])),
+                               error_prefix="Errore CSV")
+    
+    def format_timings(self, timings: List[tuple]) -> str:
+        lines = [f"{os.path.basename(filename)}: {count} eventi in {seconds:.2f}s"
+                 for filename, count, seconds in timings]
+        return "\n\n" + "\n".join(lines)
+    
+    def apply_csv_events(self, filename: str, csv_events: List[CourseEvent], replace: bool,
+                         details: str = ""):
+        if not csv_events:
+            messagebox.showwarning("Attenzione", "Nessun evento nel CSV")
+            return
+        
+        if replace:
+            self.events.clear()
+        counts = merge_events(self.events, csv_events)
+        self.loaded_csv_filename = filename
+        
+        self.refresh_events_tree()
+        self.update_statistics()
+        self.update_csv_indicator()
+        
+        summary = f"{counts['added']} nuovi"
+        if counts['merged'] or counts['duplicate']:
+            summary += f", {counts['merged']} uniti, {counts['duplicate']} già presenti"
+        messagebox.showinfo("Successo", 
+                           f"CSV caricato: {len(csv_events)} eventi ({summary}){details}")
+        self.update_status(f"CSV caricato: {len(csv_events)} eventi ({summary})")
     
     def update_csv_indicator(self):
         if self.loaded_csv_filename:
@@ -677,81 +764,24 @@ class GoogleCalendarGenerator:
             messagebox.showwarning("Attenzione", "Nessun evento")
             return
         
-        preview_window = tk.Toplevel(self.root)
-        preview_window.title("Anteprima CSV")
-        preview_window.geometry("800x500")
-        
-        text_widget = scrolledtext.ScrolledText(preview_window, wrap=tk.NONE)
-        text_widget.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        rows = self.generate_csv_rows()
-        
-        headers = ['Subject', 'Start Date', 'Start Time', 'End Date', 'End Time', 
-                  'All Day Event', 'Description', 'Location', 'Private']
-        text_widget.insert(tk.END, ','.join(headers) + '\n')
-        text_widget.insert(tk.END, '-' * 100 + '\n')
-        
-        for i, row in enumerate(rows[:20]):
-            line = ','.join([str(row.get(h, '')) for h in headers])
-            text_widget.insert(tk.END, f"{i+1}. {line}\n")
-        
-        if len(rows) > 20:
-            text_widget.insert(tk.END, f"\n... e altri {len(rows) - 20} eventi\n")
-        
-        text_widget.insert(tk.END, f"\nTOTALE: {len(rows)} eventi")
-        text_widget.config(state=tk.DISABLED)
-        
-        ttk.Button(preview_window, text="Chiudi", 
-                  command=preview_window.destroy).pack(pady=10)
+        CsvPreviewWindow(self.root, self.expanded_events())
     
     def generate_csv_rows(self) -> List[Dict]:
-        rows = []
-        
-        for event in self.events:
-            if event.all_day:
-                start = parse_date_flexible(event.start_date)
-                end = parse_date_flexible(event.end_date)
-                current = start
-                
-                while current <= end:
-                    row = {
-                        'Subject': event.subject,
-                        'Start Date': format_date_for_google(current),
-                        'Start Time': '',
-                        'End Date': format_date_for_google(current),
-                        'End Time': '',
-                        'All Day Event': 'True',
-                        'Description': event.description,
-                        'Location': '',
-                        'Private': 'True' if event.is_private else 'False'
-                    }
-                    rows.append(row)
-                    current += timedelta(days=1)
-            else:
-                start = parse_date_flexible(event.start_date)
-                end = parse_date_flexible(event.end_date)
-                
-                for session in event.sessions:
-                    dates = get_dates_for_weekday(start, end, session.weekday)
-                    
-                    for date in dates:
-                        row = {
-                            'Subject': event.subject,
-                            'Start Date': format_date_for_google(date),
-                            'Start Time': format_time_12h(session.start_time),
-                            'End Date': format_date_for_google(date),
-                            'End Time': format_time_12h(session.end_time),
-                            'All Day Event': 'False',
-                            'Description': event.description,
-                            'Location': session.location,
-                            'Private': 'True' if event.is_private else 'False'
-                        }
-                        rows.append(row)
-        
-        rows.sort(key=lambda r: (r['Start Date'], r['Start Time'] or '00:00'))
-        return rows
-    
-    def generate_csv(self):
+        return generate_csv_rows(self.expanded_events())
+    
+    def generate_csv_period(self):
+        start_date = parse_date_flexible(self.start_date_var.get().strip())
+        end_date = parse_date_flexible(self.end_date_var.get().strip())
+        if not start_date or not end_date:
+            messagebox.showerror("Errore", "Imposta data inizio e fine del periodo da esportare")
+            return
+        
+        self.generate_csv((start_date.toordinal(), end_date.toordinal()))
+    
+    def generate_csv(self, window=None):
+        if self.task_running():
+            return
+        
         if not self.events:
             messagebox.showerror("Errore", "Nessun evento")
             return
@@ -763,29 +793,49 @@ class GoogleCalendarGenerator:
         
         filename = filedialog.asksaveasfilename(
             defaultextension='.csv',
-            filetypes=[('CSV files', '*.csv')],
+            filetypes=[('CSV files', '*.csv'), ('CSV gzip', '*.csv.gz')],
             initialfile=os.path.basename(suggested_name)
         )
         
         if not filename:
             return
         
-        try:
-            rows = self.generate_csv_rows()
-            
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['Subject', 'Start Date', 'Start Time', 'End Date', 'End Time',
-                            'All Day Event', 'Description', 'Location', 'Private']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(rows)
-            
-            messagebox.showinfo("Successo", 
-                               f"CSV salvato: {os.path.basename(filename)}\n{len(rows)} eventi")
-            self.update_status(f"CSV salvato: {len(rows)} eventi")
-            
-        except Exception as e:
-            messagebox.showerror("Errore", f"Errore salvataggio: {str(e)}")
+        self.run_in_background("Generazione CSV", partial(write_csv, window=window),
+                               (self.expanded_events(), filename),
+                               lambda count: self.csv_saved(filename, count),
+                               error_prefix="Errore salvataggio")
+    
+    def csv_saved(self, filename: str, count: int):
+        messagebox.showinfo("Successo", 
+                           f"CSV salvato: {os.path.basename(filename)}\n{count} eventi")
+        self.update_status(f"CSV salvato: {count} eventi")
+    
+    def generate_ics(self):
+        if self.task_running():
+            return
+        
+        if not self.events:
+            messagebox.showerror("Errore", "Nessun evento")
+            return
+        
+        filename = filedialog.asksaveasfilename(
+            defaultextension='.ics',
+            filetypes=[('iCalendar files', '*.ics')],
+            initialfile=f'calendar_{datetime.now().strftime("%Y%m%d_%H%M%S")}.ics'
+        )
+        
+        if not filename:
+            return
+        
+        self.run_in_background("Generazione ICS", write_ics,
+                               (self.expanded_events(), filename),
+                               lambda count: self.ics_saved(filename, count),
+                               error_prefix="Errore salvataggio")
+    
+    def ics_saved(self, filename: str, count: int):
+        messagebox.showinfo("Successo", 
+                           f"ICS salvato: {os.path.basename(filename)}\n{count} eventi ricorrenti")
+        self.update_status(f"ICS salvato: {count} eventi ricorrenti")
     
     # Configuration
     def save_config(self):
@@ -795,7 +845,7 @@ class GoogleCalendarGenerator:
         
         filename = filedialog.asksaveasfilename(
             defaultextension='.json',
-            filetypes=[('JSON files', '*.json')],
+            filetypes=[('JSON files', '*.json'), ('JSON Lines compatto', '*.jsonl')],
             initialfile='config.json'
         )
         
@@ -803,32 +853,7 @@ class GoogleCalendarGenerator:
             return
         
         try:
-            config = {
-                'events': []
-            }
-            
-            for event in self.events:
-                event_dict = {
-                    'subject': event.subject,
-                    'description': event.description,
-                    'start_date': event.start_date,
-                    'end_date': event.end_date,
-                    'is_private': event.is_private,
-                    'all_day': event.all_day,
-                    'sessions': [
-                        {
-                            'weekday': s.weekday,
-                            'start_time': s.start_time,
-                            'end_time': s.end_time,
-                            'location': s.location
-                        }
-                        for s in event.sessions
-                    ]
-                }
-                config['events'].append(event_dict)
-            
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=2)
+            save_config_file(self.events, filename, self.exclusions)
             
             messagebox.showinfo("Successo", "Configurazione salvata")
             self.update_status("Configurazione salvata")
@@ -837,47 +862,90 @@ class GoogleCalendarGenerator:
             messagebox.showerror("Errore", f"Errore: {str(e)}")
     
     def load_config(self):
+        if self.task_running():
+            return
+        
         filename = filedialog.askopenfilename(
-            filetypes=[('JSON files', '*.json')]
+            filetypes=[('JSON files', '*.json'), ('JSON Lines compatto', '*.jsonl')]
         )
         
         if not filename:
             return
         
+        self.run_in_background("Caricamento configurazione", load_config_file, (filename,),
+                               self.apply_config_events, error_prefix="Errore")
+    
+    def apply_config_events(self, config: Tuple[List[CourseEvent], Tuple[Tuple[int, int], ...]]):
+        # Kept as loaded: a compact config stays lazy until its rows are shown
+        self.events, self.exclusions = config
+        
+        self.refresh_events_tree()
+        self.update_statistics()
+        messagebox.showinfo("Successo", "Configurazione caricata")
+        self.update_status("Configurazione caricata")
+    
+    # SQLite catalog
+    def open_store(self):
+        if self.task_running():
+            return
+        
+        start_date = parse_date_flexible(self.start_date_var.get().strip())
+        end_date = parse_date_flexible(self.end_date_var.get().strip())
+        if not start_date or not end_date:
+            messagebox.showerror("Errore", "Imposta data inizio e fine del periodo da caricare")
+            return
+        
+        filename = filedialog.asksaveasfilename(
+            title="Apri o crea archivio",
+            defaultextension='.db',
+            filetypes=[('SQLite', '*.db *.sqlite *.sqlite3')],
+            initialfile='catalogo.db',
+            confirmoverwrite=False
+        )
+        
+        if not filename:
+            return
+        if self.events and not messagebox.askyesno(
+                "Conferma", "Sostituire gli eventi correnti con il periodo dall'archivio?"):
+            return
+        
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-            
-            self.events.clear()
-            
-            for event_dict in config['events']:
-                sessions = []
-                for s_dict in event_dict.get('sessions', []):
-                    sessions.append(Session(
-                        weekday=s_dict['weekday'],
-                        start_time=s_dict['start_time'],
-                        end_time=s_dict['end_time'],
-                        location=s_dict['location']
-                    ))
-                
-                event = CourseEvent(
-                    subject=event_dict['subject'],
-                    description=event_dict['description'],
-                    start_date=event_dict['start_date'],
-                    end_date=event_dict['end_date'],
-                    sessions=sessions,
-                    is_private=event_dict.get('is_private', True),
-                    all_day=event_dict.get('all_day', False)
-                )
-                self.events.append(event)
-            
-            self.refresh_events_tree()
-            self.update_statistics()
-            messagebox.showinfo("Successo", "Configurazione caricata")
-            self.update_status("Configurazione caricata")
-            
+            store = EventStore(filename)
+            events = store.query(start_date.toordinal(), end_date.toordinal())
         except Exception as e:
-            messagebox.showerror("Errore", f"Errore: {str(e)}")
+            messagebox.showerror("Errore", f"Errore archivio: {str(e)}")
+            return
+        
+        self.close_store()
+        self.store = store
+        self.exclusions = store.exclusions()
+        self.events.clear()
+        self.events.extend(events)
+        self.refresh_events_tree()
+        self.update_statistics()
+        self.update_status(f"Archivio {os.path.basename(filename)}: {len(events)} corsi nel periodo "
+                           f"(su {store.count()})")
+    
+    def save_store(self):
+        if self.task_running():
+            return
+        if self.store is None:
+            messagebox.showwarning("Attenzione", "Apri prima un archivio")
+            return
+        
+        try:
+            counts = self.store.save(self.events, self.exclusions)
+        except Exception as e:
+            messagebox.showerror("Errore", f"Errore archivio: {str(e)}")
+            return
+        
+        self.update_status(f"Archivio salvato: {counts['inserted']} nuovi, "
+                           f"{counts['updated']} modificati, {counts['deleted']} rimossi")
+    
+    def close_store(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
     
     def clear_form(self):
         self.subject_var.set("")
@@ -886,12 +954,16 @@ class GoogleCalendarGenerator:
         self.current_sessions.clear()
     
     def reset_all(self):
+        if self.task_running():
+            return
         if self.events and not messagebox.askyesno("Conferma", "Reset tutto?"):
             return
         
         self.events.clear()
+        self.exclusions = ()
         self.current_sessions.clear()
         self.loaded_csv_filename = None
+        self.close_store()
         self.clear_form()
         self.start_date_var.set("15/09/2025")
         self.end_date_var.set("22/12/2025")
@@ -900,6 +972,62 @@ class GoogleCalendarGenerator:
         self.update_csv_indicator()
         self.update_status("Reset completato")
     
+    # Background tasks
+    def run_in_background(self, label: str, func: Callable, args: tuple,
+                          on_done: Callable, error_prefix: str = "Errore"):
+        """Avvia func in un thread di lavoro; on_done riceve il risultato nel mainloop"""
+        self.task = BackgroundTask(func, *args)
+        self.task_label = label
+        self.task_on_done = on_done
+        self.task_error_prefix = error_prefix
+        
+        self.progress_var.set(0)
+        self.progress_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=2)
+        self.update_status(f"{label}...")
+        
+        self.task.start()
+        self.root.after(TASK_POLL_MS, self.poll_task)
+    
+    def poll_task(self):
+        try:
+            while True:
+                kind, payload = self.task.queue.get_nowait()
+                if kind != 'progress':
+                    self.finish_task(kind, payload)
+                    return
+                done, total = payload
+                percent = done * 100 / total if total else 0
+                self.progress_var.set(percent)
+                self.status_var.set(f"{self.task_label}... {percent:.0f}%")
+        except queue.Empty:
+            pass
+        self.root.after(TASK_POLL_MS, self.poll_task)
+    
+    def finish_task(self, kind: str, payload):
+        # The UI only changes here, in one step, once the worker is done
+        label = self.task_label
+        self.task = None
+        self.progress_frame.pack_forget()
+        
+        if kind == 'done':
+            self.task_on_done(payload)
+        elif kind == 'cancelled':
+            self.update_status(f"{label} annullato")
+        else:
+            self.update_status(f"{label} non riuscito")
+            messagebox.showerror("Errore", f"{self.task_error_prefix}: {str(payload)}")
+    
+    def cancel_task(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.update_status(f"{self.task_label}: annullamento...")
+    
+    def task_running(self) -> bool:
+        if self.task is not None:
+            messagebox.showwarning("Attenzione", "Operazione in corso: attendi o annulla")
+            return True
+        return False
+    
     def update_status(self, message: str):
         self.status_var.set(message)
         self.root.update_idletasks()
@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calendar_engine import generate_csv_rows, load_ics_events
+
+def write_ics(tmp_path, *vevents):
+    path = tmp_path / 'calendar.ics'
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0']
+    for props in vevents:
+        lines += ['BEGIN:VEVENT'] + props + ['END:VEVENT']
+    path.write_text('\r\n'.join(lines + ['END:VCALENDAR']) + '\r\n', encoding='utf-8')
+    return str(path)
+
+def exported_dates(filename):
+    return [row['Start Date'] for row in generate_csv_rows(load_ics_events(filename))]
+
+def test_all_day_weekly_rule_keeps_its_weekday(tmp_path):
+    filename = write_ics(tmp_path, ['UID:a', 'SUMMARY:Seminario', 'DTSTART;VALUE=DATE:20250919',
+                                    'DTEND;VALUE=DATE:20250920', 'RRULE:FREQ=WEEKLY;COUNT=4'])
+    assert exported_dates(filename) == ['09/19/2025', '09/26/2025', '10/03/2025', '10/10/2025']
+
+def test_all_day_daily_rule_keeps_its_byday(tmp_path):
+    filename = write_ics(tmp_path, ['UID:b', 'SUMMARY:Lab', 'DTSTART;VALUE=DATE:20250915',
+                                    'DTEND;VALUE=DATE:20250916',
+                                    'RRULE:FREQ=DAILY;BYDAY=MO,WE;UNTIL=20250926'])
+    assert exported_dates(filename) == ['09/15/2025', '09/17/2025', '09/22/2025', '09/24/2025']
+
+def test_recurrence_id_replaces_the_moved_instance(tmp_path):
+    filename = write_ics(
+        tmp_path,
+        ['UID:c', 'SUMMARY:Analisi', 'RECURRENCE-ID:20250922T100000',
+         'DTSTART:20250923T100000', 'DTEND:20250923T120000'],
+        ['UID:c', 'SUMMARY:Analisi', 'DTSTART:20250915T100000', 'DTEND:20250915T120000',
+         'RRULE:FREQ=WEEKLY;UNTIL=20251006T235959'])
+    assert exported_dates(filename) == ['09/15/2025', '09/23/2025', '09/29/2025', '10/06/2025']